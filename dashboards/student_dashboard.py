@@ -6,6 +6,7 @@ performance, learning progress, and personalized recommendations.
 """
 
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
@@ -17,6 +18,15 @@ import os
 sys.path.append('/app/utils')
 from mongodb_client import MongoDBClient
 
+# Streamlit re-runs the script on every widget interaction; cached loaders and
+# frames are reused for this many seconds per student
+CACHE_TTL_SECONDS = 300
+
+@st.cache_resource
+def get_mongo_client():
+    """Create one MongoDB client per dashboard server process."""
+    return MongoDBClient()
+
 def main():
     st.set_page_config(
         page_title="EduFlow Student Dashboard",
@@ -29,7 +39,7 @@ def main():
     
     # Initialize MongoDB client
     try:
-        mongo_client = MongoDBClient()
+        mongo_client = get_mongo_client()
     except Exception as e:
         st.error(f"Database connection failed: {str(e)}")
         return
@@ -39,7 +49,7 @@ def main():
     
     # Get list of students (anonymized)
     try:
-        students = mongo_client.get_collection_data('canvas_students', limit=100)
+        students = mongo_client.list_students(limit=100)
         if not students:
             st.warning("No student data available")
             return
@@ -72,47 +82,88 @@ def main():
         return
     
     # Dashboard sections
-    display_overview(student_data)
-    display_course_performance(student_data)
-    display_engagement_metrics(student_data)
+    display_overview(load_student_overview(mongo_client, selected_student_id))
+    display_course_performance(selected_student_id, student_data)
+    display_engagement_metrics(selected_student_id, student_data)
     display_recommendations(student_data)
 
+# The cached fetches skip the client's access audit, since cache hits never
+# reach it; the load_* wrappers log the FERPA access event on every view instead
+@st.cache_data(ttl=CACHE_TTL_SECONDS)
+def _fetch_student_data(_mongo_client, student_id):
+    """Cached student data fetch; the client is excluded from the cache key."""
+    return _mongo_client.get_student_data(student_id, audit=False)
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS)
+def _fetch_student_overview(_mongo_client, student_id):
+    """Cached overview fetch; the client is excluded from the cache key."""
+    return _mongo_client.get_student_overview(student_id, audit=False)
+
 def load_student_data(mongo_client, student_id):
     """Load comprehensive student data."""
     try:
-        return mongo_client.get_student_data(student_id)
+        student_data = _fetch_student_data(mongo_client, student_id)
+        mongo_client.log_student_access('student_data_access', student_id,
+                                        f"Dashboard viewed data from {len(student_data)} collections")
+        return student_data
     except Exception as e:
         st.error(f"Failed to load student data: {str(e)}")
         return None
-def display_overview(student_data):
+
+def load_student_overview(mongo_client, student_id):
+    """Load headline metrics aggregated server-side."""
+    try:
+        overview = _fetch_student_overview(mongo_client, student_id)
+        mongo_client.log_student_access('student_overview_access', student_id,
+                                        "Dashboard viewed aggregated overview metrics")
+        return overview
+    except Exception as e:
+        st.error(f"Failed to load student overview: {str(e)}")
+        return None
+
+def display_overview(overview):
     """Display student overview metrics."""
     st.header("📊 Academic Overview")
     
-    col1, col2, col3, col4 = st.columns(4)
-    
-    # Calculate metrics
-    enrollments = student_data.get('canvas_enrollments', [])
-    submissions = student_data.get('canvas_submissions', [])
-    attendance = student_data.get('attendance_records', [])
+    if not overview:
+        st.info("No overview metrics available")
+        return
     
-    active_courses = len([e for e in enrollments if e.get('enrollment_state') == 'active'])
-    total_submissions = len(submissions)
-    avg_score = sum(s.get('score', 0) for s in submissions if s.get('score')) / max(len(submissions), 1)
-    attendance_rate = len([a for a in attendance if a.get('status') == 'present']) / max(len(attendance), 1) * 100
+    col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric("Active Courses", active_courses)
+        st.metric("Active Courses", overview['active_courses'])
     
     with col2:
-        st.metric("Total Submissions", total_submissions)
+        st.metric("Total Submissions", overview['total_submissions'])
     
     with col3:
-        st.metric("Average Score", f"{avg_score:.1f}%")
+        st.metric("Average Score", f"{overview['avg_score']:.1f}%")
     
     with col4:
-        st.metric("Attendance Rate", f"{attendance_rate:.1f}%")
+        st.metric("Attendance Rate", f"{overview['attendance_rate']:.1f}%")
 
-def display_course_performance(student_data):
+@st.cache_data(ttl=CACHE_TTL_SECONDS)
+def build_performance_frame(student_id, _enrollments):
+    """Build the course performance DataFrame, cached per student."""
+    # Load only the needed fields straight into columns, then filter and
+    # relabel them as whole columns instead of building a dict per row
+    enrollments_df = pd.DataFrame.from_records(
+        _enrollments,
+        columns=['type', 'course_id', 'current_score', 'final_score', 'current_grade']
+    )
+    student_enrollments = enrollments_df[enrollments_df['type'] == 'StudentEnrollment']
+    
+    # Arrow-backed strings and float32 scores are what st.dataframe serializes
+    # to anyway, so the frame ships to the browser without conversion
+    return pd.DataFrame({
+        'Course': student_enrollments['course_id'].fillna('Unknown').astype('string[pyarrow]'),
+        'Current Score': student_enrollments['current_score'].fillna(0).astype('float32'),
+        'Final Score': student_enrollments['final_score'].fillna(0).astype('float32'),
+        'Grade': student_enrollments['current_grade'].fillna('N/A').astype('string[pyarrow]')
+    }).reset_index(drop=True)
+
+def display_course_performance(student_id, student_data):
     """Display course performance analytics."""
     st.header("📚 Course Performance")
     
@@ -123,19 +174,9 @@ def display_course_performance(student_data):
         return
     
     # Create performance DataFrame
-    performance_data = []
-    for enrollment in enrollments:
-        if enrollment.get('type') == 'StudentEnrollment':
-            performance_data.append({
-                'Course': enrollment.get('course_id', 'Unknown'),
-                'Current Score': enrollment.get('current_score', 0),
-                'Final Score': enrollment.get('final_score', 0),
-                'Grade': enrollment.get('current_grade', 'N/A')
-            })
-    
-    if performance_data:
-        df = pd.DataFrame(performance_data)
-        
+    df = build_performance_frame(student_id, enrollments)
+    
+    if not df.empty:
         # Performance chart
         fig = px.bar(df, x='Course', y='Current Score', 
                     title='Current Scores by Course',
@@ -147,7 +188,30 @@ def display_course_performance(student_data):
         st.subheader("Detailed Performance")
         st.dataframe(df, use_container_width=True)
 
-def display_engagement_metrics(student_data):
+@st.cache_data(ttl=CACHE_TTL_SECONDS)
+def build_attendance_trend(student_id, _attendance):
+    """Build the daily attendance count frame, cached per student."""
+    if not any('date' in record for record in _attendance):
+        return None
+    
+    # An explicit format skips pandas' per-element dateutil inference
+    dates = pd.to_datetime(pd.Series([record.get('date') for record in _attendance]),
+                           format='ISO8601', cache=True)
+    return (dates.dt.floor('D').value_counts().sort_index()
+            .rename_axis('date').reset_index(name='count'))
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS)
+def build_monthly_library_usage(student_id, _library_data):
+    """Build the monthly checkout count frame, cached per student."""
+    if not any('checkout_date' in record for record in _library_data):
+        return None
+    
+    checkout_dates = pd.to_datetime(pd.Series([record.get('checkout_date') for record in _library_data]),
+                                    format='ISO8601', cache=True)
+    return (checkout_dates.dt.to_period('M').value_counts().sort_index()
+            .rename_axis('month').reset_index(name='checkouts'))
+
+def display_engagement_metrics(student_id, student_data):
     """Display student engagement analytics."""
     st.header("🎯 Engagement Metrics")
     
@@ -157,11 +221,8 @@ def display_engagement_metrics(student_data):
         # Attendance trend
         attendance = student_data.get('attendance_records', [])
         if attendance:
-            attendance_df = pd.DataFrame(attendance)
-            if 'date' in attendance_df.columns:
-                attendance_df['date'] = pd.to_datetime(attendance_df['date'])
-                attendance_trend = attendance_df.groupby('date').size().reset_index(name='count')
-                
+            attendance_trend = build_attendance_trend(student_id, attendance)
+            if attendance_trend is not None:
                 fig = px.line(attendance_trend, x='date', y='count',
                             title='Attendance Trend')
                 st.plotly_chart(fig, use_container_width=True)
@@ -172,14 +233,9 @@ def display_engagement_metrics(student_data):
         # Library usage
         library_data = student_data.get('library_checkouts', [])
         if library_data:
-            library_df = pd.DataFrame(library_data)
-            
             # Monthly library usage
-            if 'checkout_date' in library_df.columns:
-                library_df['checkout_date'] = pd.to_datetime(library_df['checkout_date'])
-                library_df['month'] = library_df['checkout_date'].dt.to_period('M')
-                monthly_usage = library_df.groupby('month').size().reset_index(name='checkouts')
-                
+            monthly_usage = build_monthly_library_usage(student_id, library_data)
+            if monthly_usage is not None:
                 fig = px.bar(monthly_usage, x='month', y='checkouts',
                            title='Monthly Library Usage')
                 st.plotly_chart(fig, use_container_width=True)
@@ -198,39 +254,47 @@ def display_recommendations(student_data):
             if rec.get('action'):
                 st.info(f"Action: {rec['action']}")
 
+def compute_recommendation_signals(student_data):
+    """Reduce a student's records to the scalars the recommendation rules use."""
+    enrollments = student_data.get('canvas_enrollments', [])
+    attendance = student_data.get('attendance_records', [])
+    
+    # Missing scores become NaN and never count as low
+    scores = np.array([e.get('current_score', 100) for e in enrollments], dtype=np.float64)
+    statuses = np.array([a.get('status') for a in attendance], dtype=object)
+    
+    return {
+        'low_score_count': int(np.count_nonzero(scores < 70)),
+        'attendance_rate': (np.count_nonzero(statuses == 'present') / statuses.size * 100
+                            if statuses.size else None),
+        'library_checkout_count': len(student_data.get('library_checkouts', []))
+    }
+
 def generate_recommendations(student_data):
     """Generate personalized recommendations based on student data."""
     recommendations = []
-    
-    # Analyze performance
-    enrollments = student_data.get('canvas_enrollments', [])
-    submissions = student_data.get('canvas_submissions', [])
-    attendance = student_data.get('attendance_records', [])
+    signals = compute_recommendation_signals(student_data)
     
     # Low performance recommendation
-    low_scores = [e for e in enrollments if e.get('current_score', 100) < 70]
-    if low_scores:
+    low_score_count = signals['low_score_count']
+    if low_score_count:
         recommendations.append({
             'title': 'Improve Academic Performance',
-            'description': f'You have {len(low_scores)} courses with scores below 70%. Consider seeking additional help.',
+            'description': f'You have {low_score_count} courses with scores below 70%. Consider seeking additional help.',
             'action': 'Schedule office hours with instructors or visit the tutoring center.'
         })
     
     # Attendance recommendation
-    if attendance:
-        present_count = len([a for a in attendance if a.get('status') == 'present'])
-        attendance_rate = present_count / len(attendance) * 100
-        
-        if attendance_rate < 80:
-            recommendations.append({
-                'title': 'Improve Attendance',
-                'description': f'Your attendance rate is {attendance_rate:.1f}%. Regular attendance is crucial for success.',
-                'action': 'Set reminders for classes and prioritize attendance.'
-            })
+    attendance_rate = signals['attendance_rate']
+    if attendance_rate is not None and attendance_rate < 80:
+        recommendations.append({
+            'title': 'Improve Attendance',
+            'description': f'Your attendance rate is {attendance_rate:.1f}%. Regular attendance is crucial for success.',
+            'action': 'Set reminders for classes and prioritize attendance.'
+        })
     
     # Engagement recommendation
-    library_data = student_data.get('library_checkouts', [])
-    if len(library_data) < 5:
+    if signals['library_checkout_count'] < 5:
         recommendations.append({
             'title': 'Increase Resource Usage',
             'description': 'Low library resource usage detected. Additional resources can enhance learning.',
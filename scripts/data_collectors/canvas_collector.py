@@ -9,11 +9,110 @@ submissions, and grades while maintaining FERPA compliance.
 import os
 import requests
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, Callable, Union
 from datetime import datetime, timedelta
 import time
 import json
-from urllib.parse import urljoin
+import re
+import orjson
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from diskcache import Cache
+from requests.adapters import HTTPAdapter
+from urllib.parse import urljoin, urlparse, parse_qs, urlencode
+
+# Revalidated Canvas responses are kept on disk for this long
+HTTP_CACHE_TTL_SECONDS = 7 * 24 * 3600
+
+# Only course and assignment listings are cached on disk. Users, enrollments,
+# submissions, analytics and page views carry student PII and education
+# records, which must not be persisted before anonymization.
+_CACHEABLE_ENDPOINT = re.compile(r'(?:^|/)courses(?:/[^/?]+/assignments)?/?$')
+
+# Canvas API fields copied into each stored record, as
+# (stored field, API field, default when the API omits it)
+_COURSE_FIELDS = (
+    ('course_id', 'id', None),
+    ('name', 'name', None),
+    ('course_code', 'course_code', None),
+    ('sis_course_id', 'sis_course_id', None),
+    ('enrollment_term_id', 'enrollment_term_id', None),
+    ('start_at', 'start_at', None),
+    ('end_at', 'end_at', None),
+    ('created_at', 'created_at', None),
+    ('updated_at', 'updated_at', None),
+    ('total_students', 'total_students', 0),
+    ('storage_quota_mb', 'storage_quota_mb', 0),
+    ('storage_quota_used_mb', 'storage_quota_used_mb', 0),
+    ('workflow_state', 'workflow_state', None)
+)
+
+# email and login_id are anonymized before storage
+_STUDENT_FIELDS = (
+    ('sis_user_id', 'sis_user_id', None),
+    ('name', 'name', None),
+    ('sortable_name', 'sortable_name', None),
+    ('short_name', 'short_name', None),
+    ('email', 'email', None),
+    ('login_id', 'login_id', None),
+    ('created_at', 'created_at', None),
+    ('last_login', 'last_login', None),
+    ('time_zone', 'time_zone', None),
+    ('locale', 'locale', None)
+)
+
+_ENROLLMENT_FIELDS = (
+    ('enrollment_id', 'id', None),
+    ('user_id', 'user_id', None),
+    ('type', 'type', None),
+    ('role', 'role', None),
+    ('enrollment_state', 'enrollment_state', None),
+    ('created_at', 'created_at', None),
+    ('updated_at', 'updated_at', None),
+    ('start_at', 'start_at', None),
+    ('end_at', 'end_at', None)
+)
+
+# Read from the enrollment's nested grades object
+_ENROLLMENT_GRADE_FIELDS = (
+    ('current_score', 'current_score', None),
+    ('final_score', 'final_score', None),
+    ('current_grade', 'current_grade', None),
+    ('final_grade', 'final_grade', None)
+)
+
+_ASSIGNMENT_FIELDS = (
+    ('assignment_id', 'id', None),
+    ('name', 'name', None),
+    ('description', 'description', None),
+    ('points_possible', 'points_possible', None),
+    ('grading_type', 'grading_type', None),
+    ('submission_types', 'submission_types', None),
+    ('due_at', 'due_at', None),
+    ('unlock_at', 'unlock_at', None),
+    ('lock_at', 'lock_at', None),
+    ('created_at', 'created_at', None),
+    ('updated_at', 'updated_at', None),
+    ('published', 'published', None),
+    ('workflow_state', 'workflow_state', None)
+)
+
+_SUBMISSION_FIELDS = (
+    ('submission_id', 'id', None),
+    ('assignment_id', 'assignment_id', None),
+    ('user_id', 'user_id', None),
+    ('submitted_at', 'submitted_at', None),
+    ('score', 'score', None),
+    ('grade', 'grade', None),
+    ('attempt', 'attempt', None),
+    ('workflow_state', 'workflow_state', None),
+    ('submission_type', 'submission_type', None),
+    ('late', 'late', None),
+    ('missing', 'missing', None),
+    ('excused', 'excused', None),
+    ('seconds_late', 'seconds_late', None),
+    ('graded_at', 'graded_at', None)
+)
 
 class CanvasCollector:
     """Canvas LMS API client for educational data collection."""
@@ -26,82 +125,352 @@ class CanvasCollector:
         if not self.api_url or not self.api_token:
             raise ValueError("Canvas API URL and token must be provided")
         
+        # Only GETs are sent, so no Content-Type header
         self.headers = {
-            'Authorization': f'Bearer {self.api_token}',
-            'Content-Type': 'application/json'
+            'Authorization': f'Bearer {self.api_token}'
         }
         
-        # Rate limiting
-        self.rate_limit_delay = 0.1  # 100ms between requests
+        # Rate limiting: Canvas reports its remaining quota on every response,
+        # so workers only back off once it drops below the threshold, and all
+        # of them honour a pause set by any one of them
+        self.rate_limit_threshold = float(os.getenv('CANVAS_RATE_LIMIT_THRESHOLD', 100))
+        self._resume_at = 0.0
+        self._rate_lock = threading.Lock()
         self.max_retries = 3
         
-    def _make_request(self, endpoint: str, params: Optional[Dict] = None) -> Dict[str, Any]:
-        """Make authenticated request to Canvas API with rate limiting and error handling."""
+        # Course, enrollment and assignment crawls and per-course/per-user
+        # lookups are reused for this many seconds instead of being repeated
+        self.result_cache_ttl = int(os.getenv('CANVAS_RESULT_CACHE_TTL', 600))
+        self.result_cache_max_entries = 4096
+        self._result_cache: Dict[Any, Tuple[float, Any]] = {}
+        self._result_cache_lock = threading.Lock()
+        
+        # Number of courses/assignments fetched concurrently
+        self.max_concurrency = int(os.getenv('CANVAS_MAX_CONCURRENCY', 8))
+        
+        # One keep-alive session shared by all worker threads, with a pool big
+        # enough that concurrent requests never queue for a connection; the
+        # semaphore caps requests in flight across every fan-out level
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._in_flight = threading.BoundedSemaphore(self.max_concurrency)
+        self.request_timeout = float(os.getenv('CANVAS_REQUEST_TIMEOUT', 30))
+        
+        # Course and assignment responses carrying an ETag or Last-Modified are
+        # kept on disk and revalidated with conditional headers, so unchanged
+        # resources come back as bodiless 304s on later runs
+        self.cache_dir = os.path.join(os.getenv('EDUFLOW_CACHE_DIR', '/opt/airflow/.cache'), 'canvas')
+        self._http_cache = None
+        if os.getenv('CANVAS_HTTP_CACHE', 'true').lower() == 'true':
+            try:
+                self._http_cache = Cache(self.cache_dir)
+                self._evict_uncacheable()
+            except Exception as e:
+                self.logger.warning(f"Canvas response cache unavailable: {str(e)}")
+        
+        # Courses that still fail after the retry pass are appended here so a
+        # later run can backfill them
+        self.failure_log_path = os.path.join(self.cache_dir, 'failed_fetches.jsonl')
+        self._failure_log_lock = threading.Lock()
+        
+    def _send_request(self, endpoint: str,
+                      params: Optional[Union[Dict, str]] = None) -> Tuple[Any, Dict[str, Any]]:
+        """Send an authenticated, conditionally cached GET with rate limiting and retries.
+        
+        params may be a dict or an already encoded query string. Returns the
+        decoded JSON payload (None for an empty 204 body) and the parsed Link
+        header. Only connection errors and 429 responses are retried; raises
+        HTTPError for any other unsuccessful status or once every attempt was
+        rate limited.
+        """
         url = urljoin(self.api_url, endpoint)
+        query = params if isinstance(params, str) else urlencode(sorted((params or {}).items()), doseq=True)
+        cache_key = f"{url}?{query}" if self._is_cacheable(endpoint) else None
+        cached = self._http_cache.get(cache_key) if cache_key is not None else None
+        
+        conditional_headers = {}
+        if cached:
+            if cached.get('etag'):
+                conditional_headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                conditional_headers['If-Modified-Since'] = cached['last_modified']
         
-        for attempt in range(self.max_retries):
+        attempt = 0
+        refetched = False
+        while True:
             try:
-                time.sleep(self.rate_limit_delay)
-                response = requests.get(url, headers=self.headers, params=params)
-                
-                if response.status_code == 200:
-                    return response.json()
-                elif response.status_code == 429:  # Rate limited
-                    wait_time = int(response.headers.get('Retry-After', 60))
-                    self.logger.warning(f"Rate limited, waiting {wait_time} seconds")
-                    time.sleep(wait_time)
-                    continue
-                elif response.status_code == 401:
-                    raise Exception("Canvas API authentication failed")
-                else:
-                    response.raise_for_status()
-                    
+                self._wait_for_quota()
+                with self._in_flight:
+                    response = self.session.get(url, params=query, headers=conditional_headers,
+                                                timeout=self.request_timeout)
             except requests.exceptions.RequestException as e:
-                self.logger.error(f"Request failed (attempt {attempt + 1}): {str(e)}")
-                if attempt == self.max_retries - 1:
+                attempt += 1
+                self.logger.error(f"Request failed (attempt {attempt}): {str(e)}")
+                if attempt == self.max_retries:
                     raise
-                time.sleep(2 ** attempt)  # Exponential backoff
+                time.sleep(2 ** (attempt - 1))  # Exponential backoff
+                continue
+            
+            self._record_quota(response)
+            
+            if response.status_code == 200:
+                data = orjson.loads(response.content)
+                self._cache_response(cache_key, response, data)
+                return data, response.links
+            elif response.status_code == 204:  # No content
+                return None, response.links
+            elif response.status_code == 304:
+                if cached:
+                    return cached['data'], cached['links']
+                if refetched:
+                    raise requests.exceptions.HTTPError(
+                        "Canvas API answered 304 Not Modified with no cached response", response=response
+                    )
+                # Nothing cached to serve (the entry expired or was evicted),
+                # so ask once more for the full body
+                self.logger.warning(f"Canvas API answered 304 for uncached {endpoint}, re-requesting")
+                conditional_headers = {'Cache-Control': 'no-cache'}
+                refetched = True
+            elif response.status_code == 429:  # Rate limited
+                attempt += 1
+                if attempt == self.max_retries:
+                    # Raise so callers retry or record the fetch instead of
+                    # treating it as an empty result
+                    raise requests.exceptions.HTTPError(
+                        f"Canvas API rate limit still exceeded after {self.max_retries} attempts",
+                        response=response
+                    )
+                wait_time = int(response.headers.get('Retry-After', 60))
+                self.logger.warning(f"Rate limited, waiting {wait_time} seconds")
+                self._pause(wait_time)
+            elif response.status_code == 401:
+                raise Exception("Canvas API authentication failed")
+            else:
+                response.raise_for_status()
+                raise requests.exceptions.HTTPError(
+                    f"Unexpected Canvas API response status {response.status_code}", response=response
+                )
+    
+    def _pause(self, seconds: float):
+        """Hold back every worker's next request for at least this many seconds."""
+        with self._rate_lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+    
+    def _wait_for_quota(self):
+        """Sleep until any shared rate-limit pause has passed."""
+        with self._rate_lock:
+            delay = self._resume_at - time.monotonic()
         
-        return {}
+        if delay > 0:
+            time.sleep(delay)
+    
+    def _record_quota(self, response: requests.Response):
+        """Back off in proportion to how far X-Rate-Limit-Remaining is below the threshold."""
+        try:
+            remaining = float(response.headers.get('X-Rate-Limit-Remaining', self.rate_limit_threshold))
+        except ValueError:
+            return
+        
+        if remaining < self.rate_limit_threshold:
+            self._pause((self.rate_limit_threshold - remaining) * 0.01)
+    
+    def _is_cacheable(self, endpoint: str) -> bool:
+        """Check whether responses for an endpoint may be kept on disk."""
+        return self._http_cache is not None and bool(_CACHEABLE_ENDPOINT.search(endpoint))
+    
+    def _evict_uncacheable(self):
+        """Drop cached responses for endpoints that are no longer cacheable."""
+        for cache_key in list(self._http_cache.iterkeys()):
+            if not _CACHEABLE_ENDPOINT.search(urlparse(str(cache_key)).path):
+                self._http_cache.delete(cache_key)
+    
+    def _cache_response(self, cache_key: Optional[str], response: requests.Response, data: Any):
+        """Remember a response that Canvas can later revalidate."""
+        if cache_key is None:
+            return
+        
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        
+        if etag or last_modified:
+            self._http_cache.set(cache_key, {
+                'etag': etag,
+                'last_modified': last_modified,
+                'data': data,
+                'links': response.links
+            }, expire=HTTP_CACHE_TTL_SECONDS)
+    
+    def _make_request(self, endpoint: str, params: Optional[Union[Dict, str]] = None) -> Dict[str, Any]:
+        """Make authenticated request to Canvas API with rate limiting and error handling."""
+        data, _ = self._send_request(endpoint, params)
+        return data
+    
+    @staticmethod
+    def _last_page_number(links: Dict[str, Any]) -> Optional[int]:
+        """Read the page count from a Link rel="last" header, if Canvas sent a numbered one."""
+        last_url = links.get('last', {}).get('url')
+        if not last_url:
+            return None
+        
+        pages = parse_qs(urlparse(last_url).query).get('page')
+        if pages and pages[0].isdigit():
+            return int(pages[0])
+        return None
     
     def _paginate_request(self, endpoint: str, params: Optional[Dict] = None) -> List[Dict[str, Any]]:
         """Handle paginated Canvas API responses."""
-        all_data = []
-        page = 1
         per_page = 100
         
-        if params is None:
-            params = {}
+        # The filter params are the same on every page, so encode them once
+        base_query = urlencode(sorted((params or {}).items()), doseq=True)
         
-        params.update({'page': page, 'per_page': per_page})
+        def page_query(page):
+            page_params = f"page={page}&per_page={per_page}"
+            return f"{base_query}&{page_params}" if base_query else page_params
         
-        while True:
+        try:
+            data, links = self._send_request(endpoint, page_query(1))
+        except Exception as e:
+            self.logger.error(f"Pagination failed at page 1: {str(e)}")
+            raise
+        
+        if not data:
+            return []
+        
+        all_data = list(data)
+        
+        # The first response tells us how many pages there are, so fetch the
+        # rest concurrently and keep them in page order
+        last_page = self._last_page_number(links)
+        if last_page is not None:
+            def fetch_page(page):
+                return self._make_request(endpoint, page_query(page)) or []
+            
+            for page_data in self._fetch_concurrently(list(range(2, last_page + 1)), fetch_page):
+                all_data.extend(page_data)
+            
+            return all_data
+        
+        # Without a numbered last link, walk pages until a short one comes back
+        page = 1
+        while len(data) >= per_page:
+            page += 1
+            
             try:
-                data = self._make_request(endpoint, params)
-                
-                if not data or len(data) == 0:
-                    break
-                
-                all_data.extend(data)
-                
-                # Check if we got a full page (indicating more data might be available)
-                if len(data) < per_page:
-                    break
-                
-                page += 1
-                params['page'] = page
-                
+                data = self._make_request(endpoint, page_query(page))
             except Exception as e:
                 self.logger.error(f"Pagination failed at page {page}: {str(e)}")
+                raise
+            
+            if not data:
                 break
+            
+            all_data.extend(data)
         
         return all_data
     
+    @staticmethod
+    def _project(record: Dict[str, Any], fields: tuple) -> Dict[str, Any]:
+        """Copy the (stored, API, default) fields of a Canvas record into a new dict."""
+        get = record.get
+        return {target: get(source, default) for target, source, default in fields}
+    
+    def _fetch_concurrently(self, items: List[Any], fetch,
+                            describe: Optional[Callable[[Any], str]] = None) -> List[Any]:
+        """Run fetch(item) for every item on a thread pool, preserving item order.
+        
+        The per-course endpoints are latency-bound, so overlapping their round
+        trips divides wall-clock time by roughly max_concurrency. Items whose
+        fetch raises are retried once at a quarter of the concurrency. If
+        describe is given, items that still fail are logged, written to the
+        failure log and yield an empty list; otherwise the first error is raised.
+        """
+        if not items:
+            return []
+        
+        def attempt(item):
+            try:
+                return fetch(item), None
+            except Exception as e:
+                return None, e
+        
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(items))) as executor:
+            outcomes = list(executor.map(attempt, items))
+        
+        failed = [index for index, (_, error) in enumerate(outcomes) if error is not None]
+        if failed:
+            retry_workers = max(1, min(self.max_concurrency // 4, len(failed)))
+            with ThreadPoolExecutor(max_workers=retry_workers) as executor:
+                retried = executor.map(attempt, [items[index] for index in failed])
+                for index, outcome in zip(failed, retried):
+                    outcomes[index] = outcome
+        
+        results = []
+        for item, (result, error) in zip(items, outcomes):
+            if error is not None:
+                if describe is None:
+                    raise error
+                
+                self.logger.warning(f"Failed to get {describe(item)} after retry: {str(error)}")
+                self._record_failure(describe(item), error)
+                result = []
+            
+            results.append(result)
+        
+        return results
+    
+    def _record_failure(self, description: str, error: Exception):
+        """Append a fetch that failed after retrying to the failure log."""
+        entry = {
+            'item': description,
+            'error': str(error),
+            'failed_at': datetime.utcnow().isoformat()
+        }
+        
+        try:
+            with self._failure_log_lock:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                with open(self.failure_log_path, 'a') as failure_log:
+                    failure_log.write(json.dumps(entry) + '\n')
+        except OSError as e:
+            self.logger.warning(f"Could not write failure log: {str(e)}")
+    
+    def _cached(self, key: Any, load) -> Any:
+        """Return load()'s result, reusing a previous one younger than result_cache_ttl.
+        
+        Errors raised by load() are not cached. Once result_cache_max_entries
+        is reached the oldest entry is dropped.
+        """
+        with self._result_cache_lock:
+            entry = self._result_cache.get(key)
+        
+        if entry and time.monotonic() - entry[0] < self.result_cache_ttl:
+            return entry[1]
+        
+        result = load()
+        
+        with self._result_cache_lock:
+            self._result_cache.pop(key, None)
+            if len(self._result_cache) >= self.result_cache_max_entries:
+                self._result_cache.pop(next(iter(self._result_cache)))
+            self._result_cache[key] = (time.monotonic(), result)
+        
+        return result
+    
     def get_courses(self, enrollment_state: str = 'active') -> List[Dict[str, Any]]:
         """Get all courses from Canvas."""
+        return self._cached(('courses', enrollment_state),
+                            lambda: self._collect_courses(enrollment_state))
+    
+    def _collect_courses(self, enrollment_state: str) -> List[Dict[str, Any]]:
+        """Crawl all courses from Canvas."""
         self.logger.info("Collecting Canvas courses")
         
         try:
+            collected_at = datetime.utcnow()
             params = {
                 'enrollment_state': enrollment_state,
                 'include': ['term', 'course_progress', 'storage_quota_used_mb', 'total_students']
@@ -112,22 +481,8 @@ class CanvasCollector:
             # Enrich course data
             enriched_courses = []
             for course in courses:
-                enriched_course = {
-                    'course_id': course.get('id'),
-                    'name': course.get('name'),
-                    'course_code': course.get('course_code'),
-                    'sis_course_id': course.get('sis_course_id'),
-                    'enrollment_term_id': course.get('enrollment_term_id'),
-                    'start_at': course.get('start_at'),
-                    'end_at': course.get('end_at'),
-                    'created_at': course.get('created_at'),
-                    'updated_at': course.get('updated_at'),
-                    'total_students': course.get('total_students', 0),
-                    'storage_quota_mb': course.get('storage_quota_mb', 0),
-                    'storage_quota_used_mb': course.get('storage_quota_used_mb', 0),
-                    'workflow_state': course.get('workflow_state'),
-                    'collected_at': datetime.utcnow().isoformat()
-                }
+                enriched_course = self._project(course, _COURSE_FIELDS)
+                enriched_course['collected_at'] = collected_at
                 enriched_courses.append(enriched_course)
             
             self.logger.info(f"Collected {len(enriched_courses)} courses from Canvas")
@@ -142,45 +497,31 @@ class CanvasCollector:
         self.logger.info("Collecting Canvas students")
         
         try:
-            courses = self.get_courses()
-            all_students = {}  # Use dict to avoid duplicates
+            collected_at = datetime.utcnow()
+            
+            # Student IDs come from the (cached) enrollment crawl and user
+            # records are listed once per account, instead of Canvas embedding
+            # the same user object in every one of a student's enrollments
+            student_ids = dict.fromkeys(
+                enrollment['user_id'] for enrollment in self.get_enrollments()
+                if enrollment['type'] == 'StudentEnrollment' and enrollment['user_id']
+            )
+            try:
+                users_by_id = self._get_users_by_id()
+            except Exception:
+                users_by_id = {}
+            
+            if student_ids and not users_by_id:
+                self.logger.warning("Account user listing unavailable, reading users from course enrollments")
+                users_by_id = self._get_enrolled_users_by_id()
+            
+            students_list = []
+            for user_id in student_ids:
+                student_data = {'student_id': user_id}
+                student_data.update(self._project(users_by_id.get(user_id, {}), _STUDENT_FIELDS))
+                student_data['collected_at'] = collected_at
+                students_list.append(student_data)
             
-            for course in courses:
-                course_id = course['course_id']
-                
-                try:
-                    # Get enrollments for this course
-                    enrollments = self._paginate_request(
-                        f'courses/{course_id}/enrollments',
-                        {'type': ['StudentEnrollment'], 'include': ['user']}
-                    )
-                    
-                    for enrollment in enrollments:
-                        user = enrollment.get('user', {})
-                        user_id = user.get('id')
-                        
-                        if user_id and user_id not in all_students:
-                            student_data = {
-                                'student_id': user_id,
-                                'sis_user_id': user.get('sis_user_id'),
-                                'name': user.get('name'),
-                                'sortable_name': user.get('sortable_name'),
-                                'short_name': user.get('short_name'),
-                                'email': user.get('email'),  # Will be anonymized later
-                                'login_id': user.get('login_id'),  # Will be anonymized later
-                                'created_at': user.get('created_at'),
-                                'last_login': user.get('last_login'),
-                                'time_zone': user.get('time_zone'),
-                                'locale': user.get('locale'),
-                                'collected_at': datetime.utcnow().isoformat()
-                            }
-                            all_students[user_id] = student_data
-                            
-                except Exception as e:
-                    self.logger.warning(f"Failed to get students for course {course_id}: {str(e)}")
-                    continue
-            
-            students_list = list(all_students.values())
             self.logger.info(f"Collected {len(students_list)} unique students from Canvas")
             return students_list
             
@@ -188,46 +529,67 @@ class CanvasCollector:
             self.logger.error(f"Failed to collect Canvas students: {str(e)}")
             raise
     
+    def _get_users_by_id(self) -> Dict[Any, Dict[str, Any]]:
+        """List the account's users once, keyed by user ID."""
+        users = self._paginate_request('accounts/self/users', {'include': ['email', 'last_login']})
+        return {user.get('id'): user for user in users}
+    
+    def _get_enrolled_users_by_id(self) -> Dict[Any, Dict[str, Any]]:
+        """Read users embedded in each course's student enrollments, keyed by user ID.
+        
+        Fallback for tokens that may not list account users.
+        """
+        courses = self.get_courses()
+        users_by_id = {}
+        
+        def fetch_course_enrollments(course):
+            return self._paginate_request(
+                f'courses/{course["course_id"]}/enrollments',
+                {'type': ['StudentEnrollment'], 'include': ['user']}
+            )
+        
+        for enrollments in self._fetch_concurrently(courses, fetch_course_enrollments,
+                                                    lambda course: f"students for course {course['course_id']}"):
+            for enrollment in enrollments:
+                user = enrollment.get('user', {})
+                users_by_id.setdefault(user.get('id'), user)
+        
+        return users_by_id
+    
     def get_enrollments(self) -> List[Dict[str, Any]]:
         """Get enrollment data from Canvas."""
+        return self._cached('enrollments', self._collect_enrollments)
+    
+    def _collect_enrollments(self) -> List[Dict[str, Any]]:
+        """Crawl enrollment data from Canvas."""
         self.logger.info("Collecting Canvas enrollments")
         
         try:
+            collected_at = datetime.utcnow()
             courses = self.get_courses()
             all_enrollments = []
             
-            for course in courses:
+            def fetch_course_enrollments(course):
                 course_id = course['course_id']
+                course_enrollments = []
                 
-                try:
-                    enrollments = self._paginate_request(
-                        f'courses/{course_id}/enrollments',
-                        {'include': ['user', 'grades']}
-                    )
-                    
-                    for enrollment in enrollments:
-                        enrollment_data = {
-                            'enrollment_id': enrollment.get('id'),
-                            'course_id': course_id,
-                            'user_id': enrollment.get('user_id'),
-                            'type': enrollment.get('type'),
-                            'role': enrollment.get('role'),
-                            'enrollment_state': enrollment.get('enrollment_state'),
-                            'created_at': enrollment.get('created_at'),
-                            'updated_at': enrollment.get('updated_at'),
-                            'start_at': enrollment.get('start_at'),
-                            'end_at': enrollment.get('end_at'),
-                            'current_score': enrollment.get('grades', {}).get('current_score'),
-                            'final_score': enrollment.get('grades', {}).get('final_score'),
-                            'current_grade': enrollment.get('grades', {}).get('current_grade'),
-                            'final_grade': enrollment.get('grades', {}).get('final_grade'),
-                            'collected_at': datetime.utcnow().isoformat()
-                        }
-                        all_enrollments.append(enrollment_data)
-                        
-                except Exception as e:
-                    self.logger.warning(f"Failed to get enrollments for course {course_id}: {str(e)}")
-                    continue
+                enrollments = self._paginate_request(
+                    f'courses/{course_id}/enrollments',
+                    {'include': ['grades']}
+                )
+                
+                for enrollment in enrollments:
+                    enrollment_data = self._project(enrollment, _ENROLLMENT_FIELDS)
+                    enrollment_data['course_id'] = course_id
+                    enrollment_data.update(self._project(enrollment.get('grades') or {}, _ENROLLMENT_GRADE_FIELDS))
+                    enrollment_data['collected_at'] = collected_at
+                    course_enrollments.append(enrollment_data)
+                
+                return course_enrollments
+            
+            for course_enrollments in self._fetch_concurrently(courses, fetch_course_enrollments,
+                                                               lambda course: f"enrollments for course {course['course_id']}"):
+                all_enrollments.extend(course_enrollments)
             
             self.logger.info(f"Collected {len(all_enrollments)} enrollments from Canvas")
             return all_enrollments
@@ -238,44 +600,37 @@ class CanvasCollector:
     
     def get_assignments(self) -> List[Dict[str, Any]]:
         """Get assignment data from Canvas."""
+        return self._cached('assignments', self._collect_assignments)
+    
+    def _collect_assignments(self) -> List[Dict[str, Any]]:
+        """Crawl assignment data from Canvas."""
         self.logger.info("Collecting Canvas assignments")
         
         try:
+            collected_at = datetime.utcnow()
             courses = self.get_courses()
             all_assignments = []
             
-            for course in courses:
+            def fetch_course_assignments(course):
                 course_id = course['course_id']
+                course_assignments = []
                 
-                try:
-                    assignments = self._paginate_request(
-                        f'courses/{course_id}/assignments',
-                        {'include': ['submission']}
-                    )
-                    
-                    for assignment in assignments:
-                        assignment_data = {
-                            'assignment_id': assignment.get('id'),
-                            'course_id': course_id,
-                            'name': assignment.get('name'),
-                            'description': assignment.get('description'),
-                            'points_possible': assignment.get('points_possible'),
-                            'grading_type': assignment.get('grading_type'),
-                            'submission_types': assignment.get('submission_types'),
-                            'due_at': assignment.get('due_at'),
-                            'unlock_at': assignment.get('unlock_at'),
-                            'lock_at': assignment.get('lock_at'),
-                            'created_at': assignment.get('created_at'),
-                            'updated_at': assignment.get('updated_at'),
-                            'published': assignment.get('published'),
-                            'workflow_state': assignment.get('workflow_state'),
-                            'collected_at': datetime.utcnow().isoformat()
-                        }
-                        all_assignments.append(assignment_data)
-                        
-                except Exception as e:
-                    self.logger.warning(f"Failed to get assignments for course {course_id}: {str(e)}")
-                    continue
+                assignments = self._paginate_request(
+                    f'courses/{course_id}/assignments',
+                    {'include': ['submission']}
+                )
+                
+                for assignment in assignments:
+                    assignment_data = self._project(assignment, _ASSIGNMENT_FIELDS)
+                    assignment_data['course_id'] = course_id
+                    assignment_data['collected_at'] = collected_at
+                    course_assignments.append(assignment_data)
+                
+                return course_assignments
+            
+            for course_assignments in self._fetch_concurrently(courses, fetch_course_assignments,
+                                                               lambda course: f"assignments for course {course['course_id']}"):
+                all_assignments.extend(course_assignments)
             
             self.logger.info(f"Collected {len(all_assignments)} assignments from Canvas")
             return all_assignments
@@ -289,43 +644,31 @@ class CanvasCollector:
         self.logger.info("Collecting Canvas submissions")
         
         try:
-            assignments = self.get_assignments()
+            collected_at = datetime.utcnow()
+            courses = self.get_courses()
             all_submissions = []
             
-            for assignment in assignments:
-                course_id = assignment['course_id']
-                assignment_id = assignment['assignment_id']
+            def fetch_course_submissions(course):
+                course_id = course['course_id']
+                course_submissions = []
                 
-                try:
-                    submissions = self._paginate_request(
-                        f'courses/{course_id}/assignments/{assignment_id}/submissions',
-                        {'include': ['user']}
-                    )
-                    
-                    for submission in submissions:
-                        submission_data = {
-                            'submission_id': submission.get('id'),
-                            'assignment_id': assignment_id,
-                            'course_id': course_id,
-                            'user_id': submission.get('user_id'),
-                            'submitted_at': submission.get('submitted_at'),
-                            'score': submission.get('score'),
-                            'grade': submission.get('grade'),
-                            'attempt': submission.get('attempt'),
-                            'workflow_state': submission.get('workflow_state'),
-                            'submission_type': submission.get('submission_type'),
-                            'late': submission.get('late'),
-                            'missing': submission.get('missing'),
-                            'excused': submission.get('excused'),
-                            'seconds_late': submission.get('seconds_late'),
-                            'graded_at': submission.get('graded_at'),
-                            'collected_at': datetime.utcnow().isoformat()
-                        }
-                        all_submissions.append(submission_data)
-                        
-                except Exception as e:
-                    self.logger.warning(f"Failed to get submissions for assignment {assignment_id}: {str(e)}")
-                    continue
+                # One course-wide listing instead of one request per assignment
+                submissions = self._paginate_request(
+                    f'courses/{course_id}/students/submissions',
+                    {'student_ids[]': 'all', 'include': ['user']}
+                )
+                
+                for submission in submissions:
+                    submission_data = self._project(submission, _SUBMISSION_FIELDS)
+                    submission_data['course_id'] = course_id
+                    submission_data['collected_at'] = collected_at
+                    course_submissions.append(submission_data)
+                
+                return course_submissions
+            
+            for course_submissions in self._fetch_concurrently(courses, fetch_course_submissions,
+                                                               lambda course: f"submissions for course {course['course_id']}"):
+                all_submissions.extend(course_submissions)
             
             self.logger.info(f"Collected {len(all_submissions)} submissions from Canvas")
             return all_submissions
@@ -334,12 +677,18 @@ class CanvasCollector:
             self.logger.error(f"Failed to collect Canvas submissions: {str(e)}")
             raise
     
-    def get_grades(self) -> List[Dict[str, Any]]:
-        """Get grade data from Canvas."""
+    def get_grades(self, enrollments: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """Get grade data from Canvas.
+        
+        Grades are derived from enrollments; pass an already collected list to
+        avoid another crawl.
+        """
         self.logger.info("Collecting Canvas grades")
         
         try:
-            enrollments = self.get_enrollments()
+            collected_at = datetime.utcnow()
+            if enrollments is None:
+                enrollments = self.get_enrollments()
             all_grades = []
             
             for enrollment in enrollments:
@@ -352,7 +701,7 @@ class CanvasCollector:
                         'final_score': enrollment['final_score'],
                         'current_grade': enrollment['current_grade'],
                         'final_grade': enrollment['final_grade'],
-                        'collected_at': datetime.utcnow().isoformat()
+                        'collected_at': collected_at
                     }
                     all_grades.append(grade_data)
             
@@ -366,7 +715,8 @@ class CanvasCollector:
     def get_course_analytics(self, course_id: int) -> Dict[str, Any]:
         """Get analytics data for a specific course."""
         try:
-            analytics = self._make_request(f'courses/{course_id}/analytics/current')
+            analytics = self._cached(('course_analytics', course_id),
+                                     lambda: self._make_request(f'courses/{course_id}/analytics/current'))
             return analytics
         except Exception as e:
             self.logger.warning(f"Failed to get analytics for course {course_id}: {str(e)}")
@@ -375,7 +725,8 @@ class CanvasCollector:
     def get_user_activity(self, user_id: int) -> List[Dict[str, Any]]:
         """Get user activity data."""
         try:
-            activity = self._paginate_request(f'users/{user_id}/page_views')
+            activity = self._cached(('user_activity', user_id),
+                                    lambda: self._paginate_request(f'users/{user_id}/page_views'))
             return activity
         except Exception as e:
             self.logger.warning(f"Failed to get activity for user {user_id}: {str(e)}")
@@ -391,4 +742,16 @@ class CanvasCollector:
             return False
         except Exception as e:
             self.logger.error(f"Canvas API connection failed: {str(e)}")
-            return False
\ No newline at end of file
+            return False
+    
+    def close(self):
+        """Close pooled HTTP connections and the response cache."""
+        self.session.close()
+        if self._http_cache is not None:
+            self._http_cache.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
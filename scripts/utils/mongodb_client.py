@@ -6,19 +6,99 @@ including FERPA compliance features, data encryption, and audit logging.
 """
 
 import os
+import atexit
 import logging
-from typing import List, Dict, Any, Optional
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterator, Optional
 from datetime import datetime, timedelta
 import pymongo
-from pymongo import MongoClient, ASCENDING, DESCENDING
-from pymongo.errors import ConnectionFailure, DuplicateKeyError
-import json
+from pymongo import MongoClient, ASCENDING, DESCENDING, IndexModel, ReplaceOne
+from pymongo.errors import BulkWriteError, ConnectionFailure, OperationFailure
+from pymongo.write_concern import WriteConcern
 from bson import ObjectId
-import hashlib
+from bson.codec_options import CodecOptions, TypeDecoder, TypeRegistry
+from bson.raw_bson import RawBSONDocument
+
+# MongoClient instances shared by every MongoDBClient in the process, keyed by
+# connection string, so tasks and dashboard sessions reuse one connection pool
+_shared_clients: Dict[str, MongoClient] = {}
+_shared_clients_lock = threading.Lock()
+
+# Number of open MongoDBClient instances using each shared MongoClient; the
+# MongoClient is only closed when the last of them closes
+_shared_client_owners: Dict[str, int] = {}
+
+# Databases whose indexes this process has already ensured
+_indexed_databases = set()
+
+# Open instances whose buffered audit records are flushed at interpreter exit;
+# weak so that registering for the exit flush doesn't keep instances alive
+_live_clients = weakref.WeakSet()
+
+@atexit.register
+def _flush_audit_on_exit():
+    """Flush every open client's buffered audit records."""
+    for client in list(_live_clients):
+        client.flush_audit()
+
+class _ObjectIdAsStr(TypeDecoder):
+    """Decode ObjectIds straight to strings for JSON-facing reads."""
+    bson_type = ObjectId
+    
+    def transform_bson(self, value):
+        return str(value)
+
+# Codec for read_database: documents come back JSON-ready from the decoder
+_READ_CODEC_OPTIONS = CodecOptions(type_registry=TypeRegistry([_ObjectIdAsStr()]))
+
+# Codec for pass-through reads: documents stay undecoded BSON bytes
+_RAW_CODEC_OPTIONS = CodecOptions(document_class=RawBSONDocument)
 
 class MongoDBClient:
     """MongoDB client for educational data storage with privacy compliance."""
     
+    # Number of documents sent per insert_many/bulk_write round-trip
+    BULK_BATCH_SIZE = int(os.getenv('MONGODB_BULK_BATCH', 1000))
+    
+    # Server error code for a unique index violation
+    DUPLICATE_KEY_ERROR = 11000
+    
+    # Derived or expiring collections whose writes never wait for an ack;
+    # audit_logs is deliberately not listed, as it backs FERPA compliance
+    UNACKNOWLEDGED_COLLECTIONS = {'data_lineage', 'temp_data'}
+    
+    # Audit records are buffered and written together once this many are
+    # pending, or this many seconds after the first one was buffered
+    AUDIT_FLUSH_SIZE = 200
+    AUDIT_FLUSH_INTERVAL = 5.0
+    
+    # Fields holding the student ID in each collection; a student matches on
+    # any of them. Every pair is indexed in _setup_indexes so student lookups
+    # never scan.
+    STUDENT_ID_FIELDS = {
+        'canvas_students': ['student_id', 'anonymous_id'],
+        'canvas_enrollments': ['user_id'],
+        'canvas_submissions': ['user_id'],
+        'moodle_users': ['user_id', 'anonymous_id'],
+        'moodle_enrollments': ['user_id'],
+        'attendance_records': ['anonymous_id', 'student_id'],
+        'library_checkouts': ['anonymous_id', 'student_id']
+    }
+    DEFAULT_STUDENT_ID_FIELDS = ['student_id', 'user_id']
+    
+    # Uniquely indexed key of each fixed-schema collection. Writes bypass
+    # server-side validation, so documents missing it are rejected client-side
+    # instead of colliding on a null key.
+    REQUIRED_FIELDS = {
+        'canvas_students': ['student_id'],
+        'moodle_users': ['user_id'],
+        'canvas_courses': ['course_id'],
+        'moodle_courses': ['course_id'],
+        'canvas_assignments': ['assignment_id']
+    }
+    
     def __init__(self):
         self.host = os.getenv('MONGODB_HOST', 'localhost')
         self.port = int(os.getenv('MONGODB_PORT', 27017))
@@ -31,8 +111,25 @@ class MongoDBClient:
         # Initialize connection
         self.client = None
         self.database = None
+        self.read_database = None
         self._connect()
         
+        # Per-collection document preparation functions, built on first use
+        self._preps: Dict[str, Any] = {}
+        
+        # Collection handles keyed by (name, unacknowledged), see _col
+        self._collections: Dict[tuple, Any] = {}
+        
+        # Worker threads for independent per-collection operations
+        # (started on first use, and again after close_connection)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        
+        self._audit_buffer: List[Dict[str, Any]] = []
+        self._audit_lock = threading.Lock()
+        self._audit_timer: Optional[threading.Timer] = None
+        _live_clients.add(self)
+        
         # Setup indexes for performance and compliance
         self._setup_indexes()
     
@@ -44,17 +141,41 @@ class MongoDBClient:
             else:
                 connection_string = f"mongodb://{self.host}:{self.port}"
             
-            self.client = MongoClient(
-                connection_string,
-                serverSelectionTimeoutMS=5000,
-                connectTimeoutMS=10000,
-                socketTimeoutMS=10000
-            )
-            
-            # Test connection
-            self.client.admin.command('ping')
+            with _shared_clients_lock:
+                self.client = _shared_clients.get(connection_string)
+                
+                if self.client is None:
+                    self.client = MongoClient(
+                        connection_string,
+                        # Keep a few connections warm so callers skip the TCP/TLS
+                        # handshake, and recycle ones idle long enough to go stale
+                        maxPoolSize=int(os.getenv('MONGODB_MAX_POOL_SIZE', 50)),
+                        minPoolSize=int(os.getenv('MONGODB_MIN_POOL_SIZE', 2)),
+                        maxIdleTimeMS=int(os.getenv('MONGODB_MAX_IDLE_TIME_MS', 300000)),
+                        retryWrites=True,
+                        # Compress wire traffic for the high-volume ingestion writes;
+                        # the server picks the first compressor it also supports
+                        compressors=os.getenv('MONGODB_COMPRESSORS', 'zstd,zlib'),
+                        zlibCompressionLevel=int(os.getenv('MONGODB_ZLIB_LEVEL', -1)),
+                        serverSelectionTimeoutMS=5000,
+                        connectTimeoutMS=10000,
+                        socketTimeoutMS=10000
+                    )
+                    
+                    # Test connection
+                    self.client.admin.command('ping')
+                    
+                    _shared_clients[connection_string] = self.client
+                
+                _shared_client_owners[connection_string] = _shared_client_owners.get(connection_string, 0) + 1
+                self._connection_string = connection_string
             
             self.database = self.client[self.database_name]
+            # Same database, but ObjectIds decode as strings; only for reads
+            # returned to callers, never for writes or migrations
+            self.read_database = self.client.get_database(
+                self.database_name, codec_options=_READ_CODEC_OPTIONS
+            )
             self.logger.info(f"Connected to MongoDB: {self.host}:{self.port}/{self.database_name}")
             
         except ConnectionFailure as e:
@@ -65,68 +186,119 @@ class MongoDBClient:
             raise
     
     def _setup_indexes(self):
-        """Setup indexes for performance and compliance."""
-        try:
+        """Setup indexes for performance and compliance.
+        
+        Each collection's indexes are sent in one create_indexes call, and
+        this runs once per database per process rather than per client.
+        """
+        index_key = (self.host, self.port, self.database_name)
+        with _shared_clients_lock:
+            if index_key in _indexed_databases:
+                return
+        
+        indexes = {
             # Student data indexes
-            self.database.canvas_students.create_index([("student_id", ASCENDING)], unique=True)
-            self.database.canvas_students.create_index([("collected_at", DESCENDING)])
-            
-            self.database.moodle_users.create_index([("user_id", ASCENDING)], unique=True)
-            self.database.moodle_users.create_index([("collected_at", DESCENDING)])
-            
-            # Course data indexes
-            self.database.canvas_courses.create_index([("course_id", ASCENDING)], unique=True)
-            self.database.moodle_courses.create_index([("course_id", ASCENDING)], unique=True)
-            
-            # Enrollment indexes
-            self.database.canvas_enrollments.create_index([
-                ("course_id", ASCENDING), 
-                ("user_id", ASCENDING)
-            ])
-            self.database.moodle_enrollments.create_index([
-                ("course_id", ASCENDING), 
-                ("user_id", ASCENDING)
-            ])
-            
-            # Assignment and submission indexes
-            self.database.canvas_assignments.create_index([("assignment_id", ASCENDING)], unique=True)
-            self.database.canvas_submissions.create_index([
-                ("assignment_id", ASCENDING),
-                ("user_id", ASCENDING)
-            ])
+            'canvas_students': [
+                IndexModel([("student_id", ASCENDING)], unique=True),
+                IndexModel([("collected_at", DESCENDING)]),
+                IndexModel([("anonymous_id", ASCENDING)])
+            ],
+            'moodle_users': [
+                IndexModel([("user_id", ASCENDING)], unique=True),
+                IndexModel([("collected_at", DESCENDING)]),
+                IndexModel([("anonymous_id", ASCENDING)])
+            ],
+            
+            # Course data indexes. Every collection cleanup_old_data prunes
+            # also gets a collected_at index for its retention range delete.
+            'canvas_courses': [
+                IndexModel([("course_id", ASCENDING)], unique=True),
+                IndexModel([("collected_at", ASCENDING)])
+            ],
+            'moodle_courses': [
+                IndexModel([("course_id", ASCENDING)], unique=True),
+                IndexModel([("collected_at", ASCENDING)])
+            ],
+            
+            # Enrollment indexes, plus per-student lookups (get_student_data,
+            # get_student_overview)
+            'canvas_enrollments': [
+                IndexModel([("course_id", ASCENDING), ("user_id", ASCENDING)]),
+                IndexModel([("user_id", ASCENDING), ("enrollment_state", ASCENDING)]),
+                IndexModel([("collected_at", ASCENDING)])
+            ],
+            'moodle_enrollments': [
+                IndexModel([("course_id", ASCENDING), ("user_id", ASCENDING)]),
+                IndexModel([("user_id", ASCENDING)]),
+                IndexModel([("collected_at", ASCENDING)])
+            ],
+            
+            # Assignment and submission indexes; (course_id, score) covers the
+            # get_course_analytics submission group
+            'canvas_assignments': [
+                IndexModel([("assignment_id", ASCENDING)], unique=True),
+                IndexModel([("course_id", ASCENDING)]),
+                IndexModel([("collected_at", ASCENDING)])
+            ],
+            'canvas_submissions': [
+                IndexModel([("course_id", ASCENDING), ("score", ASCENDING)]),
+                IndexModel([("assignment_id", ASCENDING), ("user_id", ASCENDING)]),
+                IndexModel([("user_id", ASCENDING), ("submitted_at", DESCENDING)]),
+                IndexModel([("collected_at", ASCENDING)])
+            ],
             
             # Attendance indexes
-            self.database.attendance_records.create_index([
-                ("student_id", ASCENDING),
-                ("date", DESCENDING)
-            ])
+            'attendance_records': [
+                IndexModel([("student_id", ASCENDING), ("date", DESCENDING)]),
+                IndexModel([("anonymous_id", ASCENDING), ("date", DESCENDING)]),
+                IndexModel([("collected_at", ASCENDING)])
+            ],
             
             # Library usage indexes
-            self.database.library_checkouts.create_index([
-                ("student_id", ASCENDING),
-                ("checkout_date", DESCENDING)
-            ])
+            'library_checkouts': [
+                IndexModel([("student_id", ASCENDING), ("checkout_date", DESCENDING)]),
+                IndexModel([("anonymous_id", ASCENDING), ("checkout_date", DESCENDING)]),
+                IndexModel([("collected_at", ASCENDING)])
+            ],
             
             # Audit and compliance indexes
-            self.database.audit_logs.create_index([("timestamp", DESCENDING)])
-            self.database.audit_logs.create_index([("user_id", ASCENDING)])
-            self.database.audit_logs.create_index([("action", ASCENDING)])
+            'audit_logs': [
+                IndexModel([("timestamp", DESCENDING)]),
+                IndexModel([("user_id", ASCENDING)]),
+                IndexModel([("action", ASCENDING)])
+            ],
             
             # Data lineage indexes
-            self.database.data_lineage.create_index([("execution_date", DESCENDING)])
-            self.database.data_lineage.create_index([("dag_id", ASCENDING)])
+            'data_lineage': [
+                IndexModel([("execution_date", DESCENDING)]),
+                IndexModel([("dag_id", ASCENDING)]),
+                IndexModel(
+                    [("created_at", ASCENDING)],
+                    expireAfterSeconds=int(os.getenv('DATA_LINEAGE_TTL_DAYS', 90)) * 86400
+                )
+            ],
             
             # TTL index for temporary data (if needed)
-            self.database.temp_data.create_index([("expires_at", ASCENDING)], expireAfterSeconds=0)
-            
+            'temp_data': [IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0)]
+        }
+        
+        failed = False
+        for collection_name, models in indexes.items():
+            try:
+                self.database[collection_name].create_indexes(models)
+            except Exception as e:
+                # Don't raise here as indexes are not critical for basic functionality
+                self.logger.error(f"Failed to create MongoDB indexes on {collection_name}: {str(e)}")
+                failed = True
+        
+        if not failed:
+            with _shared_clients_lock:
+                _indexed_databases.add(index_key)
             self.logger.info("MongoDB indexes created successfully")
-            
-        except Exception as e:
-            self.logger.error(f"Failed to create MongoDB indexes: {str(e)}")
-            # Don't raise here as indexes are not critical for basic functionality
     
     def store_data(self, collection_name: str, data: List[Dict[str, Any]], 
-                   upsert_key: Optional[str] = None) -> Dict[str, int]:
+                   upsert_key: Optional[str] = None,
+                   fast_insert: bool = False) -> Dict[str, Optional[int]]:
         """
         Store data in MongoDB collection with optional upsert capability.
         
@@ -134,62 +306,72 @@ class MongoDBClient:
             collection_name: Name of the collection
             data: List of documents to store
             upsert_key: Key to use for upsert operations (if None, uses insert)
+            fast_insert: Use unacknowledged (w=0) batched inserts; only for
+                non-critical collections where losing a write is acceptable.
+                Always on for UNACKNOWLEDGED_COLLECTIONS.
         
         Returns:
-            Dictionary with counts of inserted, updated, and failed operations
+            Dictionary with counts of inserted, updated, and failed operations,
+            and of documents rejected before writing for missing required fields.
+            inserted is None for unacknowledged writes, as the server never
+            reports how many documents it stored.
         """
         if not data:
             self.logger.warning(f"No data provided for collection {collection_name}")
-            return {'inserted': 0, 'updated': 0, 'failed': 0}
+            return {'inserted': 0, 'updated': 0, 'failed': 0, 'rejected': 0}
         
         try:
-            collection = self.database[collection_name]
+            unacknowledged = (not upsert_key
+                              and (fast_insert or collection_name in self.UNACKNOWLEDGED_COLLECTIONS))
+            collection = self._col(collection_name, unacknowledged=unacknowledged)
             
             inserted_count = 0
             updated_count = 0
             failed_count = 0
             
+            documents, rejected_count = self._get_prep(collection_name)(data, datetime.utcnow())
+            if rejected_count:
+                required = ', '.join(self.REQUIRED_FIELDS[collection_name])
+                self.logger.warning(f"Rejected {rejected_count} documents for {collection_name} "
+                                    f"missing required fields ({required})")
+            
             if upsert_key:
-                # Perform upsert operations
-                for document in data:
+                # Documents without the key can't be matched, so they are inserted
+                keyed_documents = [document for document in documents if upsert_key in document]
+                unkeyed_documents = [document for document in documents if upsert_key not in document]
+                
+                # Perform upserts as unordered bulk writes, one round-trip per batch
+                for start in range(0, len(keyed_documents), self.BULK_BATCH_SIZE):
+                    batch = keyed_documents[start:start + self.BULK_BATCH_SIZE]
+                    operations = [
+                        ReplaceOne({upsert_key: document[upsert_key]}, document, upsert=True)
+                        for document in batch
+                    ]
                     try:
-                        if upsert_key in document:
-                            filter_query = {upsert_key: document[upsert_key]}
-                            result = collection.replace_one(
-                                filter_query, 
-                                document, 
-                                upsert=True
-                            )
-                            
-                            if result.upserted_id:
-                                inserted_count += 1
-                            elif result.modified_count > 0:
-                                updated_count += 1
-                        else:
-                            collection.insert_one(document)
-                            inserted_count += 1
-                            
+                        result = collection.bulk_write(
+                            operations,
+                            ordered=False,
+                            bypass_document_validation=True
+                        )
+                        inserted_count += result.upserted_count
+                        updated_count += result.modified_count
+                    except BulkWriteError as e:
+                        # Unordered: every operation except the failed ones was applied
+                        details = e.details
+                        inserted_count += details.get('nUpserted', 0)
+                        updated_count += details.get('nModified', 0)
+                        failed_count += len(details.get('writeErrors', []))
+                        self.logger.error(f"Bulk upsert partially failed: {len(details.get('writeErrors', []))} errors")
                     except Exception as e:
-                        self.logger.error(f"Failed to upsert document: {str(e)}")
-                        failed_count += 1
+                        self.logger.error(f"Bulk upsert failed: {str(e)}")
+                        failed_count += len(batch)
+                
+                batch_inserted, batch_failed = self._insert_batches(collection, unkeyed_documents)
+                inserted_count += batch_inserted
+                failed_count += batch_failed
             else:
-                # Perform bulk insert
-                try:
-                    result = collection.insert_many(data, ordered=False)
-                    inserted_count = len(result.inserted_ids)
-                except Exception as e:
-                    self.logger.error(f"Bulk insert failed: {str(e)}")
-                    # Try individual inserts
-                    for document in data:
-                        try:
-                            collection.insert_one(document)
-                            inserted_count += 1
-                        except DuplicateKeyError:
-                            # Skip duplicates
-                            continue
-                        except Exception as e:
-                            self.logger.error(f"Failed to insert document: {str(e)}")
-                            failed_count += 1
+                inserted_count, batch_failed = self._insert_batches(collection, documents)
+                failed_count += batch_failed
             
             # Log audit trail
             self._log_data_operation(collection_name, 'store', len(data), inserted_count, updated_count)
@@ -197,7 +379,8 @@ class MongoDBClient:
             result_summary = {
                 'inserted': inserted_count,
                 'updated': updated_count,
-                'failed': failed_count
+                'failed': failed_count,
+                'rejected': rejected_count
             }
             
             self.logger.info(f"Stored data in {collection_name}: {result_summary}")
@@ -207,11 +390,218 @@ class MongoDBClient:
             self.logger.error(f"Failed to store data in {collection_name}: {str(e)}")
             raise
     
+    def bulk_upsert_from_staging(self, staging_collection: str, target_collection: str,
+                                 on_field: str) -> int:
+        """
+        Upsert a staged collection into its target entirely server-side.
+        
+        For large loads that were first written to a staging collection with
+        plain unordered inserts; one $merge replaces the per-document
+        ReplaceOne round trips of store_data(upsert_key=...). The target must
+        have a unique index on on_field.
+        
+        Args:
+            staging_collection: Collection holding the staged documents
+            target_collection: Collection to upsert into
+            on_field: Field matching staged documents to target documents
+        
+        Returns:
+            Number of staged documents merged
+        """
+        try:
+            staging = self.database[staging_collection]
+            staged_count = staging.count_documents({})
+            
+            pipeline = [
+                # Staged _ids differ from the target's, and replacing a
+                # matched document may not change its _id
+                {'$project': {'_id': 0}},
+                {'$merge': {
+                    'into': target_collection,
+                    'on': on_field,
+                    'whenMatched': 'replace',
+                    'whenNotMatched': 'insert'
+                }}
+            ]
+            staging.aggregate(pipeline, allowDiskUse=True)
+            
+            self._log_data_operation(target_collection, 'merge', staged_count, 0, 0)
+            self.logger.info(f"Merged {staged_count} documents from {staging_collection} into {target_collection}")
+            return staged_count
+            
+        except Exception as e:
+            self.logger.error(f"Failed to merge {staging_collection} into {target_collection}: {str(e)}")
+            raise
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Get the worker pool, starting it if it isn't running."""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=int(os.getenv('MONGODB_CLIENT_WORKERS', 8)))
+            return self._executor
+    
+    def _col(self, name: str, unacknowledged: bool = False):
+        """
+        Get a cached write handle for a collection.
+        
+        Args:
+            name: Name of the collection
+            unacknowledged: Bind a w=0 write concern instead of the database default
+        
+        Returns:
+            Collection bound to the requested write concern
+        """
+        key = (name, unacknowledged)
+        collection = self._collections.get(key)
+        if collection is None:
+            write_concern = WriteConcern(w=0) if unacknowledged else None
+            collection = self.database.get_collection(name, write_concern=write_concern)
+            self._collections[key] = collection
+        return collection
+    
+    def _get_prep(self, collection_name: str):
+        """
+        Get the document preparation function for a collection.
+        
+        The function is specialized once per collection. It returns shallow
+        copies of the documents, leaving the caller's untouched, with a
+        missing collected_at stamped and ISO-string timestamps converted to
+        datetimes so retention range deletes match them. Documents missing
+        the collection's required fields are rejected rather than written.
+        
+        Args:
+            collection_name: Name of the collection
+        
+        Returns:
+            Callable taking (documents, collected_at) and returning a tuple of
+            (documents to write, number of rejected documents)
+        """
+        prep = self._preps.get(collection_name)
+        if prep is not None:
+            return prep
+        
+        required = tuple(self.REQUIRED_FIELDS.get(collection_name, ()))
+        
+        def stamped(document, collected_at):
+            document = dict(document)
+            value = document.get('collected_at')
+            if value is None:
+                document['collected_at'] = collected_at
+            elif isinstance(value, str):
+                try:
+                    document['collected_at'] = datetime.fromisoformat(value)
+                except ValueError:
+                    pass
+            return document
+        
+        if required:
+            def prep(documents, collected_at):
+                prepared = [
+                    stamped(document, collected_at) for document in documents
+                    if all(document.get(field) is not None for field in required)
+                ]
+                return prepared, len(documents) - len(prepared)
+        else:
+            def prep(documents, collected_at):
+                return [stamped(document, collected_at) for document in documents], 0
+        
+        self._preps[collection_name] = prep
+        return prep
+    
+    def _insert_batches(self, collection, documents: List[Dict[str, Any]]) -> tuple:
+        """
+        Insert documents in fixed-size unordered batches.
+        
+        Returns:
+            Tuple of (inserted, failed) counts; inserted is None when the
+            collection handle is unacknowledged (w=0)
+        """
+        inserted_count = 0
+        failed_count = 0
+        
+        # The server only accepts bypassDocumentValidation on acknowledged
+        # writes; PyMongo rejects it outright for w=0
+        insert_options = {'ordered': False}
+        if collection.write_concern.acknowledged:
+            insert_options['bypass_document_validation'] = True
+        
+        for start in range(0, len(documents), self.BULK_BATCH_SIZE):
+            batch = documents[start:start + self.BULK_BATCH_SIZE]
+            try:
+                result = collection.insert_many(batch, **insert_options)
+                inserted_count += len(result.inserted_ids)
+            except BulkWriteError as e:
+                # Unordered: the server inserted everything except the failed
+                # documents, so account for them instead of retrying one by one
+                details = e.details
+                inserted_count += details.get('nInserted', 0)
+                
+                # Duplicates were already stored by an earlier run; skip them
+                errors = [
+                    error for error in details.get('writeErrors', [])
+                    if error.get('code') != self.DUPLICATE_KEY_ERROR
+                ]
+                if errors:
+                    self.logger.error(f"Bulk insert partially failed: {errors[0].get('errmsg')}")
+                    failed_count += len(errors)
+            except Exception as e:
+                self.logger.error(f"Bulk insert failed: {str(e)}")
+                failed_count += len(batch)
+        
+        # A w=0 insert_many returns the client-side _ids whether or not the
+        # server stored the documents, so there is no count to report
+        if not collection.write_concern.acknowledged:
+            return None, failed_count
+        
+        return inserted_count, failed_count
+    
+    def store_collections(self, batches: List[tuple]) -> List[Dict[str, Optional[int]]]:
+        """
+        Store documents for several collections concurrently.
+        
+        Each batch goes through store_data on the shared worker pool, so the
+        collections are written in parallel over the shared connection pool.
+        
+        Args:
+            batches: (collection_name, documents, store_data kwargs) tuples
+        
+        Returns:
+            One store_data result summary per batch, in input order
+        """
+        futures = [
+            self._get_executor().submit(self.store_data, collection_name, documents, **options)
+            for collection_name, documents, options in batches
+        ]
+        results = [future.result() for future in futures]
+        
+        self.flush_audit()
+        return results
+    
+    def store_lineage_record(self, lineage_record: Dict[str, Any]):
+        """
+        Write a single data lineage record.
+        
+        Lineage is written once per DAG run, so it skips the bulk store_data
+        path and uses an unacknowledged insert_one; the created_at TTL index
+        keeps the collection bounded.
+        
+        Args:
+            lineage_record: Lineage document (must carry a datetime created_at)
+        """
+        try:
+            self._col('data_lineage', unacknowledged=True).insert_one(lineage_record)
+            
+        except Exception as e:
+            self.logger.error(f"Failed to store lineage record: {str(e)}")
+            raise
+    
     def get_collection_data(self, collection_name: str, 
                            filter_query: Optional[Dict] = None,
                            limit: Optional[int] = None,
                            sort_field: Optional[str] = None,
-                           sort_direction: int = DESCENDING) -> List[Dict[str, Any]]:
+                           sort_direction: int = DESCENDING,
+                           projection: Optional[Dict] = None,
+                           stringify_ids: bool = True) -> List[Dict[str, Any]]:
         """
         Retrieve data from MongoDB collection.
         
@@ -221,46 +611,134 @@ class MongoDBClient:
             limit: Maximum number of documents to return
             sort_field: Field to sort by
             sort_direction: Sort direction (ASCENDING or DESCENDING)
+            projection: Fields to return (if None, returns whole documents)
+            stringify_ids: Return ObjectIds as strings for JSON serialization
+                (decoded directly via read_database)
         
         Returns:
             List of documents
         """
         try:
-            collection = self.database[collection_name]
-            
-            if filter_query is None:
-                filter_query = {}
+            documents = list(self.iter_collection_data(
+                collection_name, filter_query, limit, sort_field,
+                sort_direction, projection, stringify_ids
+            ))
             
-            cursor = collection.find(filter_query)
+            self.logger.info(f"Retrieved {len(documents)} documents from {collection_name}")
+            return documents
             
-            if sort_field:
-                cursor = cursor.sort(sort_field, sort_direction)
+        except Exception as e:
+            self.logger.error(f"Failed to retrieve data from {collection_name}: {str(e)}")
+            raise
+    
+    def iter_collection_data(self, collection_name: str,
+                             filter_query: Optional[Dict] = None,
+                             limit: Optional[int] = None,
+                             sort_field: Optional[str] = None,
+                             sort_direction: int = DESCENDING,
+                             projection: Optional[Dict] = None,
+                             stringify_ids: bool = True,
+                             raw_bson: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Stream documents from MongoDB collection.
+        
+        Documents are yielded batch by batch as the cursor fetches them, so
+        memory is bounded by the batch size instead of the result size. Takes
+        the same arguments as get_collection_data, plus:
+        
+        Args:
+            raw_bson: Yield RawBSONDocuments that are only decoded field by
+                field on access; for callers forwarding the BSON unchanged.
+                Overrides stringify_ids.
+        
+        Yields:
+            Documents
+        """
+        if raw_bson:
+            collection = self.database.get_collection(collection_name, codec_options=_RAW_CODEC_OPTIONS)
+        else:
+            database = self.read_database if stringify_ids else self.database
+            collection = database[collection_name]
+        
+        if filter_query is None:
+            filter_query = {}
+        
+        cursor = collection.find(filter_query, projection).batch_size(self.BULK_BATCH_SIZE)
+        
+        if sort_field:
+            cursor = cursor.sort(sort_field, sort_direction)
+        
+        if limit:
+            cursor = cursor.limit(limit)
+        
+        with cursor:
+            yield from cursor
+    
+    def sample_collection_data(self, collection_name: str, sample_size: int) -> List[Dict[str, Any]]:
+        """
+        Retrieve a random sample of documents from a collection.
+        
+        Args:
+            collection_name: Name of the collection
+            sample_size: Maximum number of documents to return
+        
+        Returns:
+            Randomly sampled documents (the whole collection if it is smaller)
+        """
+        try:
+            return list(self.read_database[collection_name].aggregate([
+                {'$sample': {'size': sample_size}}
+            ]))
             
-            if limit:
-                cursor = cursor.limit(limit)
+        except Exception as e:
+            self.logger.error(f"Failed to sample {collection_name}: {str(e)}")
+            raise
+    
+    def count_collection_documents(self, collection_name: str) -> int:
+        """Count the documents in a collection exactly."""
+        try:
+            return self.database[collection_name].count_documents({})
             
-            # Convert ObjectId to string for JSON serialization
-            documents = []
-            for doc in cursor:
-                if '_id' in doc:
-                    doc['_id'] = str(doc['_id'])
-                documents.append(doc)
+        except Exception as e:
+            self.logger.error(f"Failed to count {collection_name}: {str(e)}")
+            raise
+    
+    def list_students(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        List students for selection menus.
+        
+        Only the identifying fields are projected, so the full anonymized
+        student documents never leave the server.
+        
+        Args:
+            limit: Maximum number of students to return
+        
+        Returns:
+            List of small dictionaries with anonymous_id, name_hash, student_id and name
+        """
+        try:
+            projection = {'anonymous_id': 1, 'name_hash': 1, 'student_id': 1, 'name': 1, '_id': 0}
+            students = list(self.database.canvas_students.find({}, projection).limit(limit))
             
-            self.logger.info(f"Retrieved {len(documents)} documents from {collection_name}")
-            return documents
+            self.logger.info(f"Listed {len(students)} students from canvas_students")
+            return students
             
         except Exception as e:
-            self.logger.error(f"Failed to retrieve data from {collection_name}: {str(e)}")
+            self.logger.error(f"Failed to list students: {str(e)}")
             raise
     
     def get_student_data(self, student_id: str, 
-                        include_collections: Optional[List[str]] = None) -> Dict[str, Any]:
+                        include_collections: Optional[List[str]] = None,
+                        audit: bool = True) -> Dict[str, Any]:
         """
         Get comprehensive data for a specific student across all collections.
         
         Args:
             student_id: Student identifier
             include_collections: List of collections to include (if None, includes all)
+            audit: Log the student_data_access audit event; callers that cache
+                the result must pass False and call log_student_access for
+                every view instead
         
         Returns:
             Dictionary with student data from all relevant collections
@@ -275,26 +753,37 @@ class MongoDBClient:
             
             student_data = {}
             
-            for collection_name in include_collections:
+            if include_collections:
+                # Read every collection in one round-trip: the first collection's
+                # match is unioned with each other collection's, and every
+                # document is tagged with the collection it came from
+                def source_pipeline(collection_name):
+                    return [
+                        {'$match': self._student_match(collection_name, student_id)},
+                        {'$addFields': {'_source': collection_name}}
+                    ]
+                
+                first_collection, *other_collections = include_collections
+                pipeline = source_pipeline(first_collection)
+                for collection_name in other_collections:
+                    pipeline.append({'$unionWith': {
+                        'coll': collection_name,
+                        'pipeline': source_pipeline(collection_name)
+                    }})
+                
                 try:
-                    # Different collections might use different field names for student ID
-                    id_fields = ['student_id', 'user_id']
-                    
-                    for id_field in id_fields:
-                        filter_query = {id_field: student_id}
-                        data = self.get_collection_data(collection_name, filter_query)
-                        
-                        if data:
-                            student_data[collection_name] = data
-                            break
-                            
-                except Exception as e:
-                    self.logger.warning(f"Failed to get student data from {collection_name}: {str(e)}")
-                    continue
+                    for doc in self.read_database[first_collection].aggregate(pipeline):
+                        student_data.setdefault(doc.pop('_source'), []).append(doc)
+                except OperationFailure as e:
+                    # One failing source fails the whole union; read the
+                    # collections one by one so the others are still returned
+                    self.logger.warning(f"Combined student data read failed, reading per collection: {str(e)}")
+                    student_data = self._get_student_data_per_collection(student_id, include_collections)
             
             # Log audit trail for student data access
-            self._log_audit_event('student_data_access', student_id, 
-                                f"Accessed data from {len(student_data)} collections")
+            if audit:
+                self._log_audit_event('student_data_access', student_id, 
+                                    f"Accessed data from {len(student_data)} collections")
             
             return student_data
             
@@ -302,43 +791,130 @@ class MongoDBClient:
             self.logger.error(f"Failed to get student data for {student_id}: {str(e)}")
             raise
     
+    def _get_student_data_per_collection(self, student_id: str,
+                                         collection_names: List[str]) -> Dict[str, Any]:
+        """Read a student's documents collection by collection, skipping any that fail."""
+        student_data = {}
+        
+        for collection_name in collection_names:
+            try:
+                documents = list(self.read_database[collection_name].find(
+                    self._student_match(collection_name, student_id)
+                ))
+                if documents:
+                    student_data[collection_name] = documents
+                    
+            except Exception as e:
+                self.logger.warning(f"Failed to get student data from {collection_name}: {str(e)}")
+                continue
+        
+        return student_data
+    
+    def _student_match(self, collection_name: str, student_id: str) -> Dict[str, Any]:
+        """Filter matching a student on any of the collection's student ID fields."""
+        id_fields = self.STUDENT_ID_FIELDS.get(collection_name, self.DEFAULT_STUDENT_ID_FIELDS)
+        return {'$or': [{id_field: student_id} for id_field in id_fields]}
+    
+    def get_student_overview(self, student_id: str, audit: bool = True) -> Dict[str, Any]:
+        """
+        Compute headline metrics for a student inside MongoDB.
+        
+        Only the aggregated scalars are returned, instead of every enrollment,
+        submission and attendance document for the student.
+        
+        Args:
+            student_id: Student identifier
+            audit: Log the student_overview_access audit event (see get_student_data)
+        
+        Returns:
+            Dictionary with active_courses, total_submissions, avg_score
+            and attendance_rate
+        """
+        try:
+            def student_match(collection_name):
+                return self._student_match(collection_name, student_id)
+            
+            active_courses = self.database.canvas_enrollments.count_documents(
+                {'$and': [student_match('canvas_enrollments'), {'enrollment_state': 'active'}]}
+            )
+            
+            submission_stats = next(self.database.canvas_submissions.aggregate([
+                {'$match': student_match('canvas_submissions')},
+                {'$group': {'_id': None, 'count': {'$sum': 1}, 'total_score': {'$sum': '$score'}}}
+            ]), {'count': 0, 'total_score': 0})
+            
+            attendance_stats = next(self.database.attendance_records.aggregate([
+                {'$match': student_match('attendance_records')},
+                {'$group': {
+                    '_id': None,
+                    'count': {'$sum': 1},
+                    'present': {'$sum': {'$cond': [{'$eq': ['$status', 'present']}, 1, 0]}}
+                }}
+            ]), {'count': 0, 'present': 0})
+            
+            overview = {
+                'active_courses': active_courses,
+                'total_submissions': submission_stats['count'],
+                'avg_score': submission_stats['total_score'] / max(submission_stats['count'], 1),
+                'attendance_rate': attendance_stats['present'] / max(attendance_stats['count'], 1) * 100
+            }
+            
+            # Log audit trail for student data access
+            if audit:
+                self._log_audit_event('student_overview_access', student_id,
+                                    "Accessed aggregated overview metrics")
+            
+            return overview
+            
+        except Exception as e:
+            self.logger.error(f"Failed to get student overview for {student_id}: {str(e)}")
+            raise
+    
     def get_course_analytics(self, course_id: str) -> Dict[str, Any]:
-        """Get analytics data for a specific course."""
+        """Get analytics data for a specific course.
+        
+        Counts and averages are computed by MongoDB, so only a handful of
+        scalars cross the wire instead of every course document.
+        """
         try:
             analytics = {}
             
             # Get course basic info
-            course_data = self.get_collection_data('canvas_courses', {'course_id': course_id})
-            if not course_data:
-                course_data = self.get_collection_data('moodle_courses', {'course_id': course_id})
+            course_info = (self.read_database.canvas_courses.find_one({'course_id': course_id})
+                           or self.read_database.moodle_courses.find_one({'course_id': course_id}))
             
-            if course_data:
-                analytics['course_info'] = course_data[0]
+            if course_info:
+                analytics['course_info'] = course_info
             
             # Get enrollment statistics
-            enrollments = self.get_collection_data('canvas_enrollments', {'course_id': course_id})
-            if not enrollments:
-                enrollments = self.get_collection_data('moodle_enrollments', {'course_id': course_id})
-            
-            analytics['enrollment_count'] = len(enrollments)
-            analytics['enrollment_types'] = {}
+            def enrollment_types(collection_name):
+                return {
+                    group['_id']: group['count']
+                    for group in self.database[collection_name].aggregate([
+                        {'$match': {'course_id': course_id}},
+                        {'$group': {'_id': {'$ifNull': ['$type', 'unknown']}, 'count': {'$sum': 1}}}
+                    ])
+                }
             
-            for enrollment in enrollments:
-                enrollment_type = enrollment.get('type', 'unknown')
-                analytics['enrollment_types'][enrollment_type] = \
-                    analytics['enrollment_types'].get(enrollment_type, 0) + 1
+            analytics['enrollment_types'] = (enrollment_types('canvas_enrollments')
+                                             or enrollment_types('moodle_enrollments'))
+            analytics['enrollment_count'] = sum(analytics['enrollment_types'].values())
             
             # Get assignment statistics
-            assignments = self.get_collection_data('canvas_assignments', {'course_id': course_id})
-            analytics['assignment_count'] = len(assignments)
+            analytics['assignment_count'] = self.database.canvas_assignments.count_documents(
+                {'course_id': course_id}
+            )
+            
+            # Get submission statistics; $sum skips missing and null scores
+            submission_stats = next(self.database.canvas_submissions.aggregate([
+                {'$match': {'course_id': course_id}},
+                {'$group': {'_id': None, 'count': {'$sum': 1}, 'total_score': {'$sum': '$score'}}}
+            ]), {'count': 0, 'total_score': 0})
             
-            # Get submission statistics
-            submissions = self.get_collection_data('canvas_submissions', {'course_id': course_id})
-            analytics['submission_count'] = len(submissions)
+            analytics['submission_count'] = submission_stats['count']
             
-            if submissions:
-                total_score = sum(s.get('score', 0) for s in submissions if s.get('score'))
-                analytics['average_score'] = total_score / len(submissions) if submissions else 0
+            if submission_stats['count']:
+                analytics['average_score'] = submission_stats['total_score'] / submission_stats['count']
             
             return analytics
             
@@ -360,11 +936,25 @@ class MongoDBClient:
                 'source': 'mongodb_client'
             }
             
-            self.database.audit_logs.insert_one(audit_record)
+            self._buffer_audit_record(audit_record)
             
         except Exception as e:
             self.logger.error(f"Failed to log data operation: {str(e)}")
     
+    def log_student_access(self, action: str, student_id: str, details: str):
+        """
+        Record a FERPA access audit event for a student.
+        
+        For callers serving student data from their own cache, where the
+        get_student_* call that normally logs the access is skipped.
+        
+        Args:
+            action: Audit action, e.g. 'student_data_access'
+            student_id: Student identifier
+            details: Description of what was accessed
+        """
+        self._log_audit_event(action, student_id, details)
+    
     def _log_audit_event(self, action: str, user_id: str, details: str):
         """Log audit events for compliance."""
         try:
@@ -376,11 +966,41 @@ class MongoDBClient:
                 'source': 'mongodb_client'
             }
             
-            self.database.audit_logs.insert_one(audit_record)
+            self._buffer_audit_record(audit_record)
             
         except Exception as e:
             self.logger.error(f"Failed to log audit event: {str(e)}")
     
+    def _buffer_audit_record(self, audit_record: Dict[str, Any]):
+        """Queue an audit record, flushing when the buffer is full or a timer fires."""
+        with self._audit_lock:
+            self._audit_buffer.append(audit_record)
+            flush_now = len(self._audit_buffer) >= self.AUDIT_FLUSH_SIZE
+            
+            if not flush_now and self._audit_timer is None:
+                self._audit_timer = threading.Timer(self.AUDIT_FLUSH_INTERVAL, self.flush_audit)
+                self._audit_timer.daemon = True
+                self._audit_timer.start()
+        
+        if flush_now:
+            self.flush_audit()
+    
+    def flush_audit(self):
+        """Write all buffered audit records in one unordered insert."""
+        with self._audit_lock:
+            batch, self._audit_buffer = self._audit_buffer, []
+            if self._audit_timer is not None:
+                self._audit_timer.cancel()
+                self._audit_timer = None
+        
+        if not batch:
+            return
+        
+        try:
+            self._col('audit_logs').insert_many(batch, ordered=False, bypass_document_validation=True)
+        except Exception as e:
+            self.logger.error(f"Failed to write {len(batch)} audit records: {str(e)}")
+    
     def cleanup_old_data(self, days_to_keep: int = 2555):  # 7 years for FERPA compliance
         """Clean up old data based on retention policy."""
         try:
@@ -393,28 +1013,36 @@ class MongoDBClient:
                 'attendance_records', 'library_checkouts'
             ]
             
-            total_deleted = 0
+            # Range comparisons only match values of the same BSON type, so
+            # match BSON dates and not-yet-migrated ISO strings separately;
+            # both branches are served by the collected_at index
+            expired_filter = {'$or': [
+                {'collected_at': {'$lt': cutoff_date}},
+                {'collected_at': {'$lt': cutoff_date.isoformat()}}
+            ]}
             
-            for collection_name in collections_to_clean:
+            def delete_expired(collection_name):
                 try:
-                    collection = self.database[collection_name]
-                    result = collection.delete_many({
-                        'collected_at': {'$lt': cutoff_date.isoformat()}
-                    })
+                    result = self._col(collection_name).delete_many(expired_filter)
                     
                     deleted_count = result.deleted_count
-                    total_deleted += deleted_count
                     
                     if deleted_count > 0:
                         self.logger.info(f"Deleted {deleted_count} old records from {collection_name}")
                         
                         # Log cleanup operation
                         self._log_data_operation(collection_name, 'cleanup', deleted_count, 0, 0)
+                    
+                    return deleted_count
                         
                 except Exception as e:
                     self.logger.error(f"Failed to cleanup {collection_name}: {str(e)}")
-                    continue
+                    return 0
             
+            # The deletes touch independent collections, so overlap them
+            total_deleted = sum(self._get_executor().map(delete_expired, collections_to_clean))
+            
+            self.flush_audit()
             self.logger.info(f"Data cleanup completed: {total_deleted} total records deleted")
             return total_deleted
             
@@ -422,27 +1050,76 @@ class MongoDBClient:
             self.logger.error(f"Data cleanup failed: {str(e)}")
             raise
     
+    def migrate_collected_at(self, collection_names: Optional[List[str]] = None) -> Dict[str, int]:
+        """
+        Convert ISO-string collected_at values to BSON dates in place.
+        
+        Runs one server-side pipeline update per collection; values that
+        don't parse are left unchanged.
+        
+        Args:
+            collection_names: Collections to migrate (if None, every collection
+                carrying collected_at)
+        
+        Returns:
+            Dictionary mapping collection name to the number of documents converted
+        """
+        if collection_names is None:
+            collection_names = [
+                'canvas_students', 'canvas_courses', 'canvas_enrollments',
+                'canvas_assignments', 'canvas_submissions', 'canvas_grades',
+                'moodle_users', 'moodle_courses', 'moodle_enrollments',
+                'attendance_records', 'library_checkouts'
+            ]
+        
+        migrated = {}
+        
+        for collection_name in collection_names:
+            try:
+                result = self.database[collection_name].update_many(
+                    {'collected_at': {'$type': 'string'}},
+                    [{'$set': {'collected_at': {'$dateFromString': {
+                        'dateString': '$collected_at',
+                        'onError': '$collected_at'
+                    }}}}]
+                )
+                migrated[collection_name] = result.modified_count
+                
+            except Exception as e:
+                self.logger.error(f"Failed to migrate collected_at in {collection_name}: {str(e)}")
+                raise
+        
+        self.logger.info(f"Migrated collected_at to dates: {migrated}")
+        return migrated
+    
     def get_collection_stats(self) -> Dict[str, Dict[str, Any]]:
-        """Get statistics for all collections."""
+        """Get statistics for all collections.
+        
+        document_count comes from collection metadata, like
+        estimated_document_count(), so it can be briefly off after an unclean
+        shutdown; use count_documents where an exact count matters.
+        """
         try:
             stats = {}
             
-            for collection_name in self.database.list_collection_names():
+            # Views have no storage statistics
+            for collection_name in self.database.list_collection_names(filter={'type': 'collection'}):
                 try:
                     collection = self.database[collection_name]
                     
-                    # Get basic stats
-                    count = collection.count_documents({})
-                    
-                    # Get size information
-                    collection_stats = self.database.command("collStats", collection_name)
+                    # Count and size information in one round-trip; the count
+                    # comes from collection metadata rather than an index scan
+                    # (one result per shard on sharded clusters)
+                    shard_stats = list(collection.aggregate([
+                        {'$collStats': {'storageStats': {}, 'count': {}}}
+                    ]))
                     
                     stats[collection_name] = {
-                        'document_count': count,
-                        'size_bytes': collection_stats.get('size', 0),
-                        'storage_size_bytes': collection_stats.get('storageSize', 0),
-                        'index_count': collection_stats.get('nindexes', 0),
-                        'index_size_bytes': collection_stats.get('totalIndexSize', 0)
+                        'document_count': sum(s.get('count', 0) for s in shard_stats),
+                        'size_bytes': sum(s['storageStats'].get('size', 0) for s in shard_stats),
+                        'storage_size_bytes': sum(s['storageStats'].get('storageSize', 0) for s in shard_stats),
+                        'index_count': max((s['storageStats'].get('nindexes', 0) for s in shard_stats), default=0),
+                        'index_size_bytes': sum(s['storageStats'].get('totalIndexSize', 0) for s in shard_stats)
                     }
                     
                 except Exception as e:
@@ -466,7 +1143,34 @@ class MongoDBClient:
             return False
     
     def close_connection(self):
-        """Close MongoDB connection."""
+        """
+        Release this instance's MongoDB connection.
+        
+        The underlying MongoClient is shared by every instance in the process
+        with the same connection string, so it is only closed once the last
+        of them is closed.
+        """
+        self.flush_audit()
+        _live_clients.discard(self)
+        
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        
         if self.client:
-            self.client.close()
-            self.logger.info("MongoDB connection closed")
\ No newline at end of file
+            with _shared_clients_lock:
+                owners = _shared_client_owners.get(self._connection_string, 1) - 1
+                if owners > 0:
+                    _shared_client_owners[self._connection_string] = owners
+                    client_to_close = None
+                else:
+                    _shared_client_owners.pop(self._connection_string, None)
+                    _shared_clients.pop(self._connection_string, None)
+                    client_to_close = self.client
+            
+            self.client = None
+            
+            if client_to_close is not None:
+                client_to_close.close()
+                self.logger.info("MongoDB connection closed")
\ No newline at end of file
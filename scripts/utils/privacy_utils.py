@@ -8,18 +8,59 @@ including FERPA compliance, data anonymization, encryption, and audit logging.
 import os
 import hashlib
 import logging
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Iterator, Optional, Union
 from datetime import datetime
 import json
 import re
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 import base64
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+@lru_cache(maxsize=100_000)
+def _anonymous_id(original_id: str) -> str:
+    """SHA-256 anonymous ID, cached because the same students recur across
+    the student, attendance and library batches of a run."""
+    # Only the first 8 digest bytes are kept, so hex-encode just those
+    return f"anon_{hashlib.sha256(original_id.encode()).digest()[:8].hex()}"
+
+@lru_cache(maxsize=100_000)
+def _field_hash(value: str) -> str:
+    """SHA-256 hex digest of a PII field value, cached like _anonymous_id."""
+    return hashlib.sha256(value.encode()).hexdigest()
+
+# PrivacyUtils instance of an anonymization worker process
+_worker_privacy_utils = None
+
+def _init_anonymization_worker(encryption_key: bytes):
+    """Build the worker's PrivacyUtils with the parent's key; the parent
+    writes the batch's audit event, so workers don't."""
+    global _worker_privacy_utils
+    os.environ['ENCRYPTION_KEY'] = encryption_key.decode()
+    os.environ['ENABLE_AUDIT_LOGGING'] = 'false'
+    _worker_privacy_utils = PrivacyUtils()
+
+def _anonymize_chunk(method_name: str, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Anonymize one chunk of records in a worker process."""
+    return list(getattr(_worker_privacy_utils, method_name)(records))
 
 class PrivacyUtils:
     """Privacy and compliance utilities for educational data."""
     
+    # Leading byte of AES-GCM field ciphertexts. Legacy Fernet tokens always
+    # start with 'g' (their base64-encoded 0x80 version byte), so the two
+    # formats can be told apart on decryption.
+    AESGCM_FORMAT_VERSION = b'\x01'
+    AESGCM_NONCE_SIZE = 12
+    
+    # Field plans cached per record schema (see _field_plan); the cache is
+    # reset if heterogeneous records ever produce more schemas than this
+    MAX_FIELD_PLANS = 256
+    
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         
@@ -35,6 +76,16 @@ class PrivacyUtils:
         
         self.cipher = Fernet(self.encryption_key)
         
+        # Fields are encrypted with AES-GCM under a key derived from the same
+        # secret; the Fernet cipher is kept to decrypt fields stored before
+        aead_key = HKDF(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=None,
+            info=b'eduflow-field-encryption'
+        ).derive(self.encryption_key)
+        self._aead = AESGCM(aead_key)
+        
         # FERPA compliance settings
         self.ferpa_enabled = os.getenv('FERPA_COMPLIANCE_MODE', 'true').lower() == 'true'
         self.audit_enabled = os.getenv('ENABLE_AUDIT_LOGGING', 'true').lower() == 'true'
@@ -48,16 +99,33 @@ class PrivacyUtils:
             'student_id': r'\b\d{6,10}\b'  # Assuming student IDs are 6-10 digits
         }
         
-        # Fields that contain PII and should be anonymized
-        self.pii_fields = [
+        self._pii_compiled = {pii_type: re.compile(pattern) for pii_type, pattern in self.pii_patterns.items()}
+        
+        # All patterns combined into one alternation, so a string without PII
+        # (the common case) is rejected in a single scan; only strings that
+        # match are checked pattern by pattern
+        self._pii_any = self._combine_patterns(self.pii_patterns.keys())
+        self._maskable_pii_any = self._combine_patterns(['email', 'phone', 'ssn'])
+        
+        # Fields that contain PII and should be anonymized (frozensets, as
+        # they are only ever used for per-field membership tests)
+        self.pii_fields = frozenset([
             'email', 'login_id', 'name', 'sortable_name', 'short_name',
             'phone', 'address', 'ssn', 'student_number', 'sis_user_id'
-        ]
+        ])
         
         # Fields that should be encrypted
-        self.sensitive_fields = [
+        self.sensitive_fields = frozenset([
             'email', 'phone', 'address', 'ssn', 'student_number'
-        ]
+        ])
+        
+        self._field_plans: Dict[tuple, List[tuple]] = {}
+        
+        # Batches larger than one chunk are split across this many worker
+        # processes. Keep at 1 where task processes are daemonic (e.g. Airflow
+        # Celery workers), as those cannot start child processes.
+        self.anonymization_workers = int(os.getenv('ANONYMIZATION_WORKERS', 1))
+        self.anonymization_chunk_size = int(os.getenv('ANONYMIZATION_CHUNK_SIZE', 10000))
     
     def anonymize_student_data(self, students: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
@@ -73,41 +141,58 @@ class PrivacyUtils:
             self.logger.info("Data anonymization is disabled")
             return students
         
+        anonymized_students = self._anonymize_in_processes('iter_anonymize_students', students)
+        if anonymized_students is None:
+            return list(self.iter_anonymize_students(students))
+        
+        self.logger.info(f"Anonymized {len(students)} student records")
+        
+        # Log audit event
+        if self.audit_enabled:
+            self._log_privacy_event(
+                'student_data_anonymization',
+                f"Anonymized {len(students)} student records"
+            )
+        
+        return anonymized_students
+    
+    def iter_anonymize_students(self, students: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """
+        Anonymize student data one record at a time.
+        
+        Same output as anonymize_student_data, but yielded as it is produced
+        so callers writing records out as they go never hold the whole
+        anonymized batch in memory.
+        
+        Args:
+            students: List of student records
+            
+        Yields:
+            Anonymized student records
+        """
+        if not self.anonymization_enabled:
+            yield from students
+            return
+        
         try:
-            anonymized_students = []
+            anonymous_ids = self._batch_anonymous_ids(students)
+            anonymized_at = datetime.utcnow().isoformat()
             
             for student in students:
-                anonymized_student = self._anonymize_record(student.copy())
+                # Encrypt sensitive fields and hash other PII fields
+                anonymized_student = self._anonymized_copy(student, encode_pii=True)
                 
                 # Generate consistent anonymous ID
                 if 'student_id' in student:
-                    anonymized_student['anonymous_id'] = self._generate_anonymous_id(
-                        str(student['student_id'])
-                    )
-                
-                # Remove or hash PII fields
-                for field in self.pii_fields:
-                    if field in anonymized_student:
-                        if field in self.sensitive_fields:
-                            # Encrypt sensitive fields
-                            anonymized_student[f'{field}_encrypted'] = self._encrypt_field(
-                                str(anonymized_student[field])
-                            )
-                            del anonymized_student[field]
-                        else:
-                            # Hash other PII fields
-                            anonymized_student[f'{field}_hash'] = self._hash_field(
-                                str(anonymized_student[field])
-                            )
-                            del anonymized_student[field]
+                    anonymized_student['anonymous_id'] = anonymous_ids[str(student['student_id'])]
                 
                 # Add anonymization metadata
-                anonymized_student['anonymized_at'] = datetime.utcnow().isoformat()
+                anonymized_student['anonymized_at'] = anonymized_at
                 anonymized_student['privacy_level'] = 'ferpa_compliant'
                 
-                anonymized_students.append(anonymized_student)
+                yield anonymized_student
             
-            self.logger.info(f"Anonymized {len(anonymized_students)} student records")
+            self.logger.info(f"Anonymized {len(students)} student records")
             
             # Log audit event
             if self.audit_enabled:
@@ -116,8 +201,6 @@ class PrivacyUtils:
                     f"Anonymized {len(students)} student records"
                 )
             
-            return anonymized_students
-            
         except Exception as e:
             self.logger.error(f"Student data anonymization failed: {str(e)}")
             raise
@@ -127,97 +210,215 @@ class PrivacyUtils:
         if not self.anonymization_enabled:
             return attendance_records
         
-        try:
-            anonymized_records = []
-            
-            for record in attendance_records:
-                anonymized_record = self._anonymize_record(record.copy())
-                
-                # Replace student ID with anonymous ID
-                if 'student_id' in record:
-                    anonymized_record['anonymous_id'] = self._generate_anonymous_id(
-                        str(record['student_id'])
-                    )
-                    del anonymized_record['student_id']
-                
-                # Remove any PII that might be in attendance records
-                for field in self.pii_fields:
-                    if field in anonymized_record:
-                        del anonymized_record[field]
-                
-                anonymized_record['anonymized_at'] = datetime.utcnow().isoformat()
-                anonymized_records.append(anonymized_record)
-            
-            self.logger.info(f"Anonymized {len(anonymized_records)} attendance records")
-            return anonymized_records
-            
-        except Exception as e:
-            self.logger.error(f"Attendance data anonymization failed: {str(e)}")
-            raise
+        anonymized_records = self._anonymize_in_processes('iter_anonymize_attendance', attendance_records)
+        if anonymized_records is None:
+            return list(self.iter_anonymize_attendance(attendance_records))
+        
+        self.logger.info(f"Anonymized {len(attendance_records)} attendance records")
+        return anonymized_records
+    
+    def iter_anonymize_attendance(self, attendance_records: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Anonymize attendance data one record at a time."""
+        yield from self._iter_anonymize_activity(attendance_records, 'attendance')
     
     def anonymize_library_data(self, library_records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Anonymize library usage data."""
         if not self.anonymization_enabled:
             return library_records
         
+        anonymized_records = self._anonymize_in_processes('iter_anonymize_library', library_records)
+        if anonymized_records is None:
+            return list(self.iter_anonymize_library(library_records))
+        
+        self.logger.info(f"Anonymized {len(library_records)} library records")
+        return anonymized_records
+    
+    def iter_anonymize_library(self, library_records: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Anonymize library usage data one record at a time."""
+        yield from self._iter_anonymize_activity(library_records, 'library')
+    
+    def _iter_anonymize_activity(self, records: List[Dict[str, Any]], kind: str) -> Iterator[Dict[str, Any]]:
+        """Anonymize attendance or library records, which share the same rules."""
+        if not self.anonymization_enabled:
+            yield from records
+            return
+        
         try:
-            anonymized_records = []
+            anonymous_ids = self._batch_anonymous_ids(records)
+            anonymized_at = datetime.utcnow().isoformat()
             
-            for record in library_records:
-                anonymized_record = self._anonymize_record(record.copy())
+            for record in records:
+                # Remove any PII that might be in the record, and the student ID
+                anonymized_record = self._anonymized_copy(record, encode_pii=False, drop_student_id=True)
                 
                 # Replace student ID with anonymous ID
                 if 'student_id' in record:
-                    anonymized_record['anonymous_id'] = self._generate_anonymous_id(
-                        str(record['student_id'])
-                    )
-                    del anonymized_record['student_id']
-                
-                # Remove PII from library records
-                for field in self.pii_fields:
-                    if field in anonymized_record:
-                        del anonymized_record[field]
+                    anonymized_record['anonymous_id'] = anonymous_ids[str(record['student_id'])]
                 
-                anonymized_record['anonymized_at'] = datetime.utcnow().isoformat()
-                anonymized_records.append(anonymized_record)
+                anonymized_record['anonymized_at'] = anonymized_at
+                yield anonymized_record
             
-            self.logger.info(f"Anonymized {len(anonymized_records)} library records")
-            return anonymized_records
+            self.logger.info(f"Anonymized {len(records)} {kind} records")
             
         except Exception as e:
-            self.logger.error(f"Library data anonymization failed: {str(e)}")
+            self.logger.error(f"{kind.capitalize()} data anonymization failed: {str(e)}")
             raise
     
-    def _anonymize_record(self, record: Dict[str, Any]) -> Dict[str, Any]:
-        """Anonymize a single record by removing or masking PII."""
+    def _anonymize_in_processes(self, method_name: str,
+                                records: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+        """
+        Anonymize a large batch in chunks across worker processes.
+        
+        Records are independent and anonymization is CPU-bound (regex,
+        SHA-256, AES-GCM), so chunks scale with cores once the batch is large
+        enough to amortize starting the workers.
+        
+        Args:
+            method_name: iter_anonymize_* method each worker runs on its chunk
+            records: Records to anonymize
+            
+        Returns:
+            Anonymized records in input order, or None when the batch should
+            be anonymized in this process instead
+        """
+        chunk_size = self.anonymization_chunk_size
+        if self.anonymization_workers <= 1 or len(records) <= chunk_size:
+            return None
+        
+        chunks = [records[start:start + chunk_size] for start in range(0, len(records), chunk_size)]
+        
         try:
-            # Scan for PII patterns in string fields
-            for key, value in record.items():
-                if isinstance(value, str):
-                    # Check for email patterns
-                    if re.search(self.pii_patterns['email'], value):
-                        record[key] = self._mask_email(value)
-                    
-                    # Check for phone patterns
-                    elif re.search(self.pii_patterns['phone'], value):
-                        record[key] = self._mask_phone(value)
-                    
-                    # Check for SSN patterns
-                    elif re.search(self.pii_patterns['ssn'], value):
-                        record[key] = self._mask_ssn(value)
+            with ProcessPoolExecutor(
+                max_workers=min(self.anonymization_workers, len(chunks)),
+                initializer=_init_anonymization_worker,
+                initargs=(self.encryption_key,)
+            ) as executor:
+                return [
+                    record
+                    for chunk in executor.map(_anonymize_chunk, [method_name] * len(chunks), chunks)
+                    for record in chunk
+                ]
+        except Exception as e:
+            self.logger.warning(f"Parallel anonymization failed, anonymizing in process: {str(e)}")
+            return None
+    
+    def _anonymized_copy(self, record: Dict[str, Any], encode_pii: bool,
+                         drop_student_id: bool = False) -> Dict[str, Any]:
+        """
+        Build the anonymized version of a record in a single pass over its fields.
+        
+        String values matching PII patterns are masked first. PII fields are
+        then encrypted (sensitive fields) or hashed into *_encrypted/*_hash
+        fields, or dropped entirely when encode_pii is False.
+        
+        Args:
+            record: Source record, left unmodified
+            encode_pii: Keep PII fields as encrypted/hashed values instead of dropping them
+            drop_student_id: Leave out the student_id field
+            
+        Returns:
+            New anonymized record
+        """
+        anonymized = {}
+        
+        # Bound once as a local; this loop runs for every field of every record
+        mask_value = self._mask_value
+        
+        for key, output_key, encode in self._field_plan(tuple(record), encode_pii, drop_student_id):
+            value = record[key]
+            if isinstance(value, str):
+                value = mask_value(value)
+            
+            anonymized[output_key] = value if encode is None else encode(str(value))
+        
+        return anonymized
+    
+    def _field_plan(self, keys: tuple, encode_pii: bool, drop_student_id: bool) -> List[tuple]:
+        """
+        Get the per-field anonymization plan for a record schema.
+        
+        Records from one source share the same keys, so the PII field lookups
+        are resolved once per schema instead of once per record.
+        
+        Args:
+            keys: Record keys, in order
+            encode_pii: As for _anonymized_copy
+            drop_student_id: As for _anonymized_copy
+            
+        Returns:
+            (key, output_key, encode) tuples for the fields to emit, where
+            encode is the hash/encrypt function or None to copy the value
+        """
+        plan_key = (keys, encode_pii, drop_student_id)
+        plan = self._field_plans.get(plan_key)
+        if plan is not None:
+            return plan
+        
+        plan = []
+        for key in keys:
+            if key in self.pii_fields:
+                if not encode_pii:
+                    continue
+                if key in self.sensitive_fields:
+                    plan.append((key, f'{key}_encrypted', self._encrypt_field))
+                else:
+                    plan.append((key, f'{key}_hash', self._hash_field))
+            elif not (drop_student_id and key == 'student_id'):
+                plan.append((key, key, None))
+        
+        if len(self._field_plans) >= self.MAX_FIELD_PLANS:
+            self._field_plans.clear()
+        self._field_plans[plan_key] = plan
+        return plan
+    
+    def _mask_value(self, value: str) -> str:
+        """Mask a string value if it contains email, phone or SSN patterns."""
+        try:
+            if not self._maskable_pii_any.search(value):
+                return value
+            
+            # Check for email patterns
+            if self._pii_compiled['email'].search(value):
+                return self._mask_email(value)
             
-            return record
+            # Check for phone patterns
+            if self._pii_compiled['phone'].search(value):
+                return self._mask_phone(value)
+            
+            # Check for SSN patterns
+            if self._pii_compiled['ssn'].search(value):
+                return self._mask_ssn(value)
+            
+            return value
             
         except Exception as e:
-            self.logger.error(f"Record anonymization failed: {str(e)}")
-            return record
+            self.logger.error(f"Value masking failed: {str(e)}")
+            return value
+    
+    def _combine_patterns(self, pii_types) -> re.Pattern:
+        """Compile the given PII patterns into one alternation that matches if any does."""
+        return re.compile('|'.join(f'(?:{self.pii_patterns[pii_type]})' for pii_type in pii_types))
+    
+    def _batch_anonymous_ids(self, records: List[Dict[str, Any]]) -> Dict[str, str]:
+        """Map every distinct student_id in a batch to its anonymous ID.
+        
+        Attendance and library batches repeat the same student many times, so
+        hashing each distinct ID once keeps SHA-256 out of the per-record loop.
+        """
+        distinct_ids = {str(record['student_id']) for record in records if 'student_id' in record}
+        
+        # hashlib's SHA-256 already runs on OpenSSL (SHA-NI where the CPU has
+        # it); the cost worth removing is rehashing IDs seen in earlier batches
+        try:
+            return {original_id: _anonymous_id(original_id) for original_id in distinct_ids}
+        except Exception:
+            return {original_id: self._generate_anonymous_id(original_id) for original_id in distinct_ids}
     
     def _generate_anonymous_id(self, original_id: str) -> str:
         """Generate a consistent anonymous ID from original ID."""
         try:
             # Use SHA-256 hash for consistent anonymous IDs
-            hash_object = hashlib.sha256(original_id.encode())
-            return f"anon_{hash_object.hexdigest()[:16]}"
+            return _anonymous_id(original_id)
         except Exception as e:
             self.logger.error(f"Anonymous ID generation failed: {str(e)}")
             return f"anon_{hashlib.md5(original_id.encode()).hexdigest()[:16]}"
@@ -225,7 +426,7 @@ class PrivacyUtils:
     def _hash_field(self, value: str) -> str:
         """Hash a field value for anonymization."""
         try:
-            return hashlib.sha256(value.encode()).hexdigest()
+            return _field_hash(value)
         except Exception as e:
             self.logger.error(f"Field hashing failed: {str(e)}")
             return hashlib.md5(value.encode()).hexdigest()
@@ -233,8 +434,9 @@ class PrivacyUtils:
     def _encrypt_field(self, value: str) -> str:
         """Encrypt a sensitive field."""
         try:
-            encrypted_value = self.cipher.encrypt(value.encode())
-            return base64.b64encode(encrypted_value).decode()
+            nonce = os.urandom(self.AESGCM_NONCE_SIZE)
+            encrypted_value = self._aead.encrypt(nonce, value.encode(), None)
+            return base64.b64encode(self.AESGCM_FORMAT_VERSION + nonce + encrypted_value).decode('ascii')
         except Exception as e:
             self.logger.error(f"Field encryption failed: {str(e)}")
             return self._hash_field(value)  # Fallback to hashing
@@ -242,8 +444,18 @@ class PrivacyUtils:
     def _decrypt_field(self, encrypted_value: str) -> str:
         """Decrypt a sensitive field."""
         try:
-            encrypted_bytes = base64.b64decode(encrypted_value.encode())
-            decrypted_value = self.cipher.decrypt(encrypted_bytes)
+            # b64decode takes the ASCII string directly
+            encrypted_bytes = base64.b64decode(encrypted_value)
+            
+            if encrypted_bytes[:1] == self.AESGCM_FORMAT_VERSION:
+                nonce_end = 1 + self.AESGCM_NONCE_SIZE
+                decrypted_value = self._aead.decrypt(
+                    encrypted_bytes[1:nonce_end], encrypted_bytes[nonce_end:], None
+                )
+            else:
+                # Legacy Fernet token
+                decrypted_value = self.cipher.decrypt(encrypted_bytes)
+            
             return decrypted_value.decode()
         except Exception as e:
             self.logger.error(f"Field decryption failed: {str(e)}")
@@ -252,22 +464,20 @@ class PrivacyUtils:
     def _mask_email(self, email: str) -> str:
         """Mask email address for privacy."""
         try:
-            if '@' in email:
-                local, domain = email.split('@', 1)
-                if len(local) > 2:
-                    masked_local = local[0] + '*' * (len(local) - 2) + local[-1]
-                else:
-                    masked_local = '*' * len(local)
-                return f"{masked_local}@{domain}"
-            return email
+            local, at, domain = email.partition('@')
+            if not at:
+                return email
+            if len(local) > 2:
+                return f"{local[0]}{'*' * (len(local) - 2)}{local[-1]}@{domain}"
+            return f"{'*' * len(local)}@{domain}"
         except Exception:
             return "***@***.***"
     
     def _mask_phone(self, phone: str) -> str:
         """Mask phone number for privacy."""
         try:
-            # Remove non-digits
-            digits = re.sub(r'\D', '', phone)
+            # Keep only digits (isdecimal matches exactly what \d does)
+            digits = ''.join(filter(str.isdecimal, phone))
             if len(digits) >= 10:
                 return f"***-***-{digits[-4:]}"
             return "***-***-****"
@@ -278,12 +488,15 @@ class PrivacyUtils:
         """Mask SSN for privacy."""
         return "***-**-****"
     
-    def validate_ferpa_compliance(self, data: Dict[str, Any]) -> Dict[str, Any]:
+    def validate_ferpa_compliance(self, data: Dict[str, Any], early_exit: bool = False) -> Dict[str, Any]:
         """
         Validate that data meets FERPA compliance requirements.
         
         Args:
             data: Data to validate
+            early_exit: Stop scanning at the first field with PII; for callers
+                that only need the compliant flag, as issues then lists only
+                that field
             
         Returns:
             Validation results
@@ -303,27 +516,51 @@ class PrivacyUtils:
             # Check for PII in data
             pii_found = []
             
-            def check_for_pii(obj, path=""):
-                if isinstance(obj, dict):
-                    for key, value in obj.items():
+            def check_for_pii(root):
+                # Depth-first walk with an explicit stack of (entries, path,
+                # is_list) frames, visiting fields in the same order as a
+                # recursive walk; paths are only formatted for containers and
+                # fields where PII is found
+                stack = []
+                
+                def descend(obj, path):
+                    if isinstance(obj, dict):
+                        stack.append((iter(obj.items()), path, False))
+                    elif isinstance(obj, list):
+                        stack.append((iter(enumerate(obj)), path, True))
+                
+                descend(root, "")
+                while stack and not (early_exit and pii_found):
+                    entries, path, is_list = stack[-1]
+                    entry = next(entries, None)
+                    if entry is None:
+                        stack.pop()
+                        continue
+                    
+                    key, value = entry
+                    if is_list:
+                        if isinstance(value, (dict, list)):
+                            descend(value, f"{path}[{key}]")
+                        continue
+                    
+                    current_path = None
+                    
+                    # Check if field name suggests PII
+                    if key.lower() in self.pii_fields:
                         current_path = f"{path}.{key}" if path else key
-                        
-                        # Check if field name suggests PII
-                        if key.lower() in self.pii_fields:
-                            pii_found.append(current_path)
-                        
-                        # Check field value for PII patterns
-                        if isinstance(value, str):
-                            for pii_type, pattern in self.pii_patterns.items():
-                                if re.search(pattern, value):
+                        pii_found.append(current_path)
+                    
+                    # Check field value for PII patterns
+                    if isinstance(value, str):
+                        if self._pii_any.search(value):
+                            current_path = current_path or (f"{path}.{key}" if path else key)
+                            for pii_type, pattern in self._pii_compiled.items():
+                                if pattern.search(value):
                                     pii_found.append(f"{current_path} ({pii_type})")
-                        
-                        # Recursively check nested objects
-                        check_for_pii(value, current_path)
-                        
-                elif isinstance(obj, list):
-                    for i, item in enumerate(obj):
-                        check_for_pii(item, f"{path}[{i}]")
+                    
+                    # Check nested objects before the next field
+                    elif isinstance(value, (dict, list)):
+                        descend(value, f"{path}.{key}" if path else key)
             
             check_for_pii(data)
             
@@ -0,0 +1,166 @@
+"""
+Tests for the MongoDB client's store and read paths.
+
+The client is built without connecting, on an in-memory stand-in for the
+database that enforces the same write concern rules as the server/driver.
+"""
+
+import logging
+import os
+import sys
+import threading
+import unittest
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+from pymongo.results import InsertManyResult
+from pymongo.write_concern import WriteConcern
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts', 'utils'))
+from mongodb_client import MongoDBClient
+
+
+class FakeCollection:
+    """Collection handle over shared in-memory storage."""
+
+    def __init__(self, documents, write_concern, unreadable=False):
+        self.documents = documents
+        self.write_concern = write_concern
+        self.unreadable = unreadable
+
+    def insert_many(self, documents, ordered=True, bypass_document_validation=False):
+        if bypass_document_validation and not self.write_concern.acknowledged:
+            raise OperationFailure("Cannot set bypass_document_validation with unacknowledged write concern")
+
+        inserted_ids = []
+        for document in documents:
+            document.setdefault('_id', ObjectId())
+            inserted_ids.append(document['_id'])
+            self.documents.append(document)
+        return InsertManyResult(inserted_ids, self.write_concern.acknowledged)
+
+    def find(self, filter_query):
+        if self.unreadable:
+            raise OperationFailure("not authorized")
+
+        # Only the {'$or': [{field: value}, ...]} filters of _student_match
+        return [
+            document for document in self.documents
+            if any(document.get(field) == value
+                   for clause in filter_query['$or'] for field, value in clause.items())
+        ]
+
+    def aggregate(self, pipeline):
+        # A $unionWith over an unreadable collection fails as a whole
+        raise OperationFailure("not authorized")
+
+
+class FakeDatabase:
+    """Database whose handles for one collection share the same documents."""
+
+    def __init__(self):
+        self.collections = {}
+        self.unreadable = set()
+
+    def get_collection(self, name, write_concern=None):
+        return FakeCollection(self.collections.setdefault(name, []), write_concern or WriteConcern(),
+                              unreadable=name in self.unreadable)
+
+    def __getitem__(self, name):
+        return self.get_collection(name)
+
+
+def make_client():
+    """Build a MongoDBClient on a FakeDatabase without connecting."""
+    client = MongoDBClient.__new__(MongoDBClient)
+    client.logger = logging.getLogger(__name__)
+    client.client = None
+    client.database = FakeDatabase()
+    client.read_database = client.database
+    client._preps = {}
+    client._collections = {}
+    client._audit_buffer = []
+    client._audit_lock = threading.Lock()
+    client._audit_timer = None
+    client._executor = None
+    client._executor_lock = threading.Lock()
+    return client
+
+
+class StoreDataTest(unittest.TestCase):
+
+    def test_fast_insert_stores_documents(self):
+        client = make_client()
+        courses = [{'course_id': i, 'name': f'Course {i}'} for i in range(5)]
+
+        result = client.store_data('canvas_courses', courses, fast_insert=True)
+
+        # w=0 writes report no count, as the server never acknowledges them
+        self.assertIsNone(result['inserted'])
+        self.assertEqual(result['failed'], 0)
+        stored = client.database.collections['canvas_courses']
+        self.assertEqual(sorted(document['course_id'] for document in stored), list(range(5)))
+
+    def test_unacknowledged_collections_store_documents(self):
+        client = make_client()
+
+        for collection_name in MongoDBClient.UNACKNOWLEDGED_COLLECTIONS:
+            documents = [{'value': i} for i in range(3)]
+
+            result = client.store_data(collection_name, documents)
+
+            self.assertIsNone(result['inserted'])
+            self.assertEqual(result['failed'], 0)
+            self.assertEqual(len(client.database.collections[collection_name]), 3)
+            self.assertFalse(client._col(collection_name, unacknowledged=True).write_concern.acknowledged)
+
+    def test_store_data_rejects_documents_without_required_fields(self):
+        client = make_client()
+        students = [{'student_id': 1}, {'name': 'No ID'}, {'student_id': 2, 'collected_at': '2024-01-02T03:04:05'}]
+
+        result = client.store_data('canvas_students', students)
+
+        self.assertEqual(result['inserted'], 2)
+        self.assertEqual(result['rejected'], 1)
+        self.assertEqual(result['failed'], 0)
+
+        # The caller's documents are left as they were passed in
+        self.assertEqual(students, [{'student_id': 1}, {'name': 'No ID'},
+                                    {'student_id': 2, 'collected_at': '2024-01-02T03:04:05'}])
+        stored = client.database.collections['canvas_students']
+        self.assertTrue(all(isinstance(document['collected_at'], datetime) for document in stored))
+
+
+class GetStudentDataTest(unittest.TestCase):
+
+    def test_failing_collection_does_not_hide_the_others(self):
+        client = make_client()
+        client.database.collections['canvas_enrollments'] = [{'user_id': 's1', 'course_id': 'c1'}]
+        client.database.collections['attendance_records'] = [{'anonymous_id': 's1', 'status': 'present'}]
+        client.database.collections['library_checkouts'] = [{'anonymous_id': 's1'}]
+        client.database.unreadable.add('library_checkouts')
+
+        student_data = client.get_student_data(
+            's1', ['canvas_enrollments', 'attendance_records', 'library_checkouts']
+        )
+
+        self.assertEqual(set(student_data), {'canvas_enrollments', 'attendance_records'})
+        self.assertEqual(student_data['attendance_records'][0]['status'], 'present')
+
+
+class StoreCollectionsTest(unittest.TestCase):
+
+    def test_store_collections_after_close(self):
+        client = make_client()
+        client.store_collections([('temp_data', [{'value': 1}], {})])
+        client.close_connection()
+
+        results = client.store_collections([('temp_data', [{'value': 2}], {})])
+
+        self.assertEqual(results, [{'inserted': None, 'updated': 0, 'failed': 0, 'rejected': 0}])
+        self.assertEqual(len(client.database.collections['temp_data']), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()